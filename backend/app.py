@@ -1,17 +1,28 @@
 import logging
+import re
+from datetime import datetime, timedelta
 
-import requests
+import pytz
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 
-from services.benchmarking.influx import get_latest_benchmark
+from config import HTTP_CACHE_SETTLED_AFTER
+from services.auth import require_api_key
+from services.benchmarking.influx import get_latest_benchmark, get_benchmark_history, get_scoring_generation
+from services.compression import response_compression
+from services.formats import get_columnar_mimetype, frame_response
+from services.http_caching import is_settled, request_etag, not_modified, with_cache_headers
+from services.json_provider import OrjsonProvider
+from services.upstream_http import upstream_http
 from routes.models_routes import models_bp
 from routes.forecasts_routes import forecasts_bp
 from routes.weatherstation_routes import weatherstation_bp
 from routes.actual_routes import actual_bp
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
+response_compression.init_app(app)
 
 app.register_blueprint(models_bp)
 app.register_blueprint(forecasts_bp)
@@ -28,20 +39,74 @@ def dwd_proxy():
     if not url:
         return jsonify({"error": "url parameter is required"}), 400
     other_params = {k: v for k, v in params.items() if k != 'url'}
-    response = requests.get(url, params=other_params)
+    response = upstream_http.get(url, params=other_params)
     return response.json()
 
 
 @app.route('/models/benchmarking', methods=['GET'])
 def get_model_benchmarking():
     try:
-        return jsonify(get_latest_benchmark().to_dict(orient='records'))
+        df = get_latest_benchmark()
+        columnar_mimetype = get_columnar_mimetype(request)
+        if columnar_mimetype:
+            return frame_response(df, columnar_mimetype)
+        return jsonify(df.to_dict(orient='records'))
     except BaseException as e:
         logging.exception(
             f"Error occurred while fetching model benchmarking scores:", exc_info=e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/models/benchmarking/history', methods=['GET'])
+def get_model_benchmarking_history():
+    start = request.args.get('from')
+    stop = request.args.get('to')
+    if not start or not stop:
+        return jsonify({"error": "from and to are required parameters"}), 400
+    try:
+        start = datetime.strptime(start, '%Y-%m-%d').replace(tzinfo=pytz.utc)
+        # the last day is included
+        stop = datetime.strptime(stop, '%Y-%m-%d').replace(tzinfo=pytz.utc) + timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "from and to must be in the format YYYY-MM-DD"}), 400
+    if start >= stop:
+        return jsonify({"error": "from must not be after to"}), 400
+
+    models = request.args.getlist('model')
+    if not all(re.fullmatch(r'[\w-]+', model) for model in models):
+        return jsonify({"error": "model must be a model name"}), 400
+    lead_time_bucket = request.args.get('lead_time_bucket')
+    if lead_time_bucket is not None and not re.fullmatch(r'\w+', lead_time_bucket):
+        return jsonify({"error": "lead_time_bucket must be a lead time bucket name"}), 400
+
+    columnar_mimetype = get_columnar_mimetype(request)
+    # scoring runs may rewrite past days, so closed ranges are revalidated against the scoring generation
+    settled = is_settled(stop, timedelta(seconds=HTTP_CACHE_SETTLED_AFTER))
+    etag = request_etag(request, columnar_mimetype, get_scoring_generation()) if settled else None
+    if etag is not None:
+        response = not_modified(request, etag, mimetype=columnar_mimetype)
+        if response is not None:
+            return response
+
+    try:
+        df = get_benchmark_history(start, stop, models or None, lead_time_bucket)
+        if columnar_mimetype:
+            response = frame_response(df, columnar_mimetype)
+        else:
+            response = jsonify(df.to_dict(orient='records'))
+        return with_cache_headers(request, response, etag)
+    except Exception as e:
+        logging.exception(
+            f"Error occurred while fetching model benchmarking history:", exc_info=e)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/upstream-metrics', methods=['GET'])
+@require_api_key
+def get_upstream_metrics():
+    return jsonify(upstream_http.metrics())
+
+
 @app.route('/health-check', methods=['GET'])
 def health_check():
     return "success"
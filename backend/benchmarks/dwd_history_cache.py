@@ -0,0 +1,52 @@
+"""
+Benchmark of /actual/temperature-history style reads through the DWD history
+cache on a synthetic 10-minute series of the last ten years.
+
+The fetch function stands in for the DWD request and sleeps for a fixed time
+per requested year, roughly what downloading and parsing one zipped DWD file
+takes. The first (cold) read fetches every year, the second (warm) read is
+served from the Parquet partitions except for the not yet settled years.
+
+Run from the backend directory:
+    python -m benchmarks.dwd_history_cache
+"""
+
+import tempfile
+import time
+from datetime import datetime
+
+import polars as pl
+import pytz
+
+from services.actual.DwdHistoryCache import DwdHistoryCache
+
+SECONDS_PER_FETCHED_YEAR = 0.5
+
+
+def fetch(start: datetime, end: datetime) -> pl.DataFrame:
+    time.sleep((end.year - start.year + 1) * SECONDS_PER_FETCHED_YEAR)
+    dates = pl.datetime_range(start, end, "10m", eager=True, time_zone="UTC")
+    return pl.DataFrame({
+        "station_id": "02712",
+        "dataset": "temperature_air",
+        "parameter": "temperature_air_mean_2m",
+        "date": dates,
+        "value": pl.Series(range(len(dates)), dtype=pl.Float64) % 30,
+        "quality": 3.0,
+    })
+
+
+def main():
+    end = datetime.now(pytz.utc)
+    start = datetime(end.year - 10, 1, 1, tzinfo=pytz.utc)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DwdHistoryCache(directory, settled_after_days=90)
+        print(f"{'read':<6} {'wall time [s]':>14}  rows")
+        for name in ["cold", "warm"]:
+            begin = time.perf_counter()
+            df = cache.get("temperature_air", "10_minutes", "temperature_air_mean_2m", start, end, fetch).to_pandas()
+            print(f"{name:<6} {time.perf_counter() - begin:>14.3f}  {len(df)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the Flux result decoding on a synthetic 14-day, all-field
+forecast response.
+
+Compares the former path (FluxTable records -> list of dicts -> DataFrame)
+with the columnar decoding in services.influx.query_data_frame. Every variant
+runs in a fresh process, so the reported peak RSS is not shared between them.
+
+Run from the backend directory:
+    python -m benchmarks.flux_decoding
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.flux_fixtures import write_forecast_response
+
+
+def record_based(path: str):
+    import pandas as pd
+    from influxdb_client.client.flux_csv_parser import FluxCsvParser, FluxSerializationMode
+
+    with open(path, "rb") as response:
+        parser = FluxCsvParser(response=response, serialization_mode=FluxSerializationMode.tables)
+        list(parser.generator())
+        tables = parser.tables
+
+    data = []
+    for table in tables:
+        for record in table.records:
+            data.append(record.values)
+    return pd.DataFrame(data)
+
+
+def columnar(path: str):
+    from services.influx import _decode_annotated_csv
+    import pandas as pd
+
+    with open(path, "rb") as response:
+        frames = list(_decode_annotated_csv(response))
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+VARIANTS = {"record-based": record_based, "columnar": columnar}
+
+
+def run_variant(name: str, path: str):
+    # import everything up front so that only the decoding is part of the peak RSS
+    import pandas  # noqa: F401
+    import services.influx  # noqa: F401
+    import influxdb_client.client.flux_csv_parser  # noqa: F401
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = VARIANTS[name](path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (peak - baseline) / 1024, df.shape
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "forecast.csv")
+        size = write_forecast_response(path)
+        print(f"response size: {size / 1024 ** 2:.1f} MiB")
+        print(f"{'variant':<14} {'wall time [s]':>14} {'peak RSS growth [MiB]':>22}  shape")
+        for name in VARIANTS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, rss, shape = executor.submit(run_variant, name, path).result()
+            print(f"{name:<14} {elapsed:>14.3f} {rss:>22.1f}  {shape}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Synthetic InfluxDB annotated CSV responses used by the benchmarks.
+
+The generated responses have the same layout as the pivoted `forecast`
+measurement returned by the queries in services/influx.py.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# the benchmarks import services.influx which requires the InfluxDB settings
+os.environ.setdefault("INFLUXDB_TOKEN", "benchmark")
+os.environ.setdefault("INFLUXDB_URL", "http://localhost:8086")
+os.environ.setdefault("API_KEY", "benchmark")
+
+FORECAST_FIELDS = [
+    "apparent_temperature", "cloud_cover", "cloud_cover_high", "cloud_cover_low", "cloud_cover_mid", "dew_point_2m",
+    "et0_fao_evapotranspiration", "evapotranspiration", "precipitation", "precipitation_probability", "pressure_msl",
+    "rain", "relative_humidity_2m", "showers", "snow_depth", "snowfall", "soil_moisture_0_to_1cm",
+    "soil_moisture_1_to_3cm", "soil_moisture_27_to_81cm", "soil_moisture_3_to_9cm", "soil_moisture_9_to_27cm",
+    "soil_temperature_0cm", "soil_temperature_18cm", "soil_temperature_54cm", "soil_temperature_6cm",
+    "surface_pressure", "temperature_120m", "temperature_180m", "temperature_2m", "temperature_80m",
+    "vapour_pressure_deficit", "visibility", "weather_code", "wind_direction_10m", "wind_direction_120m",
+    "wind_direction_180m", "wind_direction_80m", "wind_gusts_10m", "wind_speed_10m", "wind_speed_120m",
+    "wind_speed_180m", "wind_speed_80m",
+]
+
+
+def _format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def forecast_response(fields: list[str] = None, days: float = 14, lead_hours: int = 48,
+                      model: str = "icon_seamless", seed: int = 42):
+    """
+    Yields the lines of an annotated CSV response with one row per hourly
+    forecast run and lead hour over `days` days, pivoted over `fields`.
+    """
+    fields = FORECAST_FIELDS if fields is None else fields
+    rng = np.random.default_rng(seed)
+    stop = datetime(2025, 1, 15)
+    start = stop - timedelta(days=days)
+
+    columns = ["result", "table", "_start", "_stop", "_time", "_measurement", "forecast_date", "model"] + fields
+    data_types = ["string", "long", "dateTime:RFC3339", "dateTime:RFC3339", "dateTime:RFC3339", "string", "string",
+                  "string"] + ["double"] * len(fields)
+    groups = ["false", "false", "true", "true", "false", "true", "true", "true"] + ["false"] * len(fields)
+    defaults = ["_result"] + [""] * (len(columns) - 1)
+
+    yield ("#datatype," + ",".join(data_types) + "\r\n").encode()
+    yield ("#group," + ",".join(groups) + "\r\n").encode()
+    yield ("#default," + ",".join(defaults) + "\r\n").encode()
+    yield ("," + ",".join(columns) + "\r\n").encode()
+
+    table = 0
+    for run in range(round(days * 24)):
+        run_time = start + timedelta(hours=run)
+        values = rng.normal(10, 5, size=(lead_hours, len(fields))).round(2)
+        for lead in range(lead_hours):
+            forecast_date = run_time + timedelta(hours=lead)
+            row = ["", str(table), _format_time(start), _format_time(stop), _format_time(run_time), "forecast",
+                   _format_time(forecast_date), model]
+            row += [str(value) for value in values[lead].tolist()]
+            yield ("," + ",".join(row) + "\r\n").encode()
+        table += 1
+    yield b"\r\n"
+
+
+def write_forecast_response(path: str, **kwargs) -> int:
+    """
+    Writes a synthetic forecast response to `path` and returns its size in bytes.
+    """
+    size = 0
+    with open(path, "wb") as file:
+        for line in forecast_response(**kwargs):
+            file.write(line)
+            size += len(line)
+    return size
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the fog detection in services/fog.py.
+
+Compares the former row-wise `df.apply(..., axis=1)` implementation with the
+vectorized column implementation and checks that both produce the same result.
+
+Run from the backend directory:
+    python -m benchmarks.fog_detection
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.fog import add_fog_based_on_conditions, add_fog_based_on_weather_code
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+
+
+def row_wise_fog_based_on_conditions(df: pd.DataFrame) -> pd.DataFrame:
+    def is_fog(temp, dew_point, humidity, wind_speed):
+        return (temp - dew_point <= 2) and (humidity >= 90) and (wind_speed <= 5)
+
+    df["fog"] = df.apply(
+        lambda row: is_fog(row["temperature_2m"], row["dew_point_2m"], row["relative_humidity_2m"], row["wind_speed_10m"]), axis=1
+    )
+    return df
+
+
+def row_wise_fog_based_on_weather_code(df: pd.DataFrame) -> pd.DataFrame:
+    df["fog"] = df.apply(lambda row: 1 if row["weather_code"] in [
+                         45, 48] else 0, axis=1)
+    return df
+
+
+def synthetic_forecast(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    temperature = rng.uniform(-10, 30, rows)
+    df = pd.DataFrame({
+        "temperature_2m": temperature,
+        "dew_point_2m": temperature - rng.uniform(0, 6, rows),
+        "relative_humidity_2m": rng.uniform(60, 100, rows),
+        "wind_speed_10m": rng.uniform(0, 15, rows),
+        "weather_code": rng.choice([0, 1, 2, 3, 45, 48, 51, 61], rows).astype(float),
+    })
+    # sprinkle missing values to cover the NaN handling
+    df.loc[rng.choice(rows, rows // 100, replace=False), "dew_point_2m"] = np.nan
+    df.loc[rng.choice(rows, rows // 100, replace=False), "weather_code"] = np.nan
+    return df
+
+
+def measure(func, df: pd.DataFrame) -> tuple[float, pd.Series]:
+    df = df.copy()
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result["fog"]
+
+
+def main():
+    print(f"{'rows':>10} {'variant':<12} {'row-wise [s]':>14} {'vectorized [s]':>16} {'speedup':>9}")
+    for rows in ROW_COUNTS:
+        df = synthetic_forecast(rows)
+        for variant, row_wise, vectorized in [
+            ("conditions", row_wise_fog_based_on_conditions, add_fog_based_on_conditions),
+            ("weather_code", row_wise_fog_based_on_weather_code, add_fog_based_on_weather_code),
+        ]:
+            row_wise_time, expected = measure(row_wise, df)
+            vectorized_time, actual = measure(vectorized, df)
+            pd.testing.assert_series_equal(expected, actual)
+            print(f"{rows:>10} {variant:<12} {row_wise_time:>14.4f} {vectorized_time:>16.4f} "
+                  f"{row_wise_time / vectorized_time:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of /forecasts with and without field projection and lead time
+restriction.
+
+Runs services.influx.get_forecasts against a local InfluxDB stand-in, which
+answers every query with a synthetic response matching the queried fields and
+lead time, and reports the transferred bytes and the query latency.
+
+Run from the backend directory:
+    python -m benchmarks.forecast_projection
+"""
+
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytz
+
+REPETITIONS = 20
+VARIANTS = [
+    ("full", None, None),
+    ("fields", ["temperature_2m", "relative_humidity_2m", "fog"], None),
+    ("max_lead=48", None, 48),
+    ("fields+max_lead=48", ["temperature_2m", "relative_humidity_2m", "fog"], 48),
+]
+
+
+class InfluxStandIn(BaseHTTPRequestHandler):
+    """
+    Answers POST /api/v2/query with a synthetic forecast response: one row per
+    hourly forecast run within the queried lead time, pivoted over the queried
+    fields.
+    """
+    transferred = 0
+
+    def do_POST(self):
+        from benchmarks.flux_fixtures import forecast_response
+
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+        lead_hours = int(re.search(r"d:(\d+)h", query).group(1))
+        fields = re.search(r'r\["_field"\], set: (\[.*?\])', query)
+        fields = json.loads(fields.group(1)) if fields else None
+
+        body = b"".join(forecast_response(fields=fields, days=lead_hours / 24, lead_hours=1))
+        InfluxStandIn.transferred += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), InfluxStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["INFLUXDB_URL"] = f"http://127.0.0.1:{server.server_port}"
+
+    from benchmarks import flux_fixtures  # noqa: F401
+    from services.influx import get_forecasts
+
+    forecast_datetime = datetime(2025, 1, 15, tzinfo=pytz.utc)
+    print(f"{'variant':<20} {'bytes/query':>12} {'median latency [ms]':>20} {'columns':>8} {'rows':>6}")
+    for name, fields, max_lead in VARIANTS:
+        InfluxStandIn.transferred = 0
+        latencies = []
+        for _ in range(REPETITIONS):
+            start = time.perf_counter()
+            df = get_forecasts("icon_seamless", forecast_datetime, fields, max_lead)
+            latencies.append(time.perf_counter() - start)
+        print(f"{name:<20} {InfluxStandIn.transferred // REPETITIONS:>12} "
+              f"{statistics.median(latencies) * 1000:>20.2f} {df.shape[1]:>8} {df.shape[0]:>6}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
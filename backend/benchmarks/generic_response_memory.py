@@ -0,0 +1,81 @@
+"""
+Memory (measured with tracemalloc) and allocation time of 100k water level
+records.
+
+Compares GenericResponseObject as a dataclass with a per-instance __dict__
+(the former layout), the slotted GenericResponseObject and a
+GenericResponseBatch holding NumPy columns.
+
+Run from the backend directory:
+    python -m benchmarks.generic_response_memory
+"""
+
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from services.actual.objects.GenericResponseBatch import GenericResponseBatch
+from services.actual.objects.GenericResponseObject import GenericResponseObject
+
+RECORDS = 100_000
+
+
+@dataclass(init=True)
+class DictGenericResponseObject:
+    name: str
+    date: datetime
+    value: Decimal
+    unit: str
+    quality: Decimal
+
+
+def columns():
+    dates = pd.date_range("2024-01-01", periods=RECORDS, freq="15min", tz="UTC")
+    values = np.random.default_rng(42).normal(300, 20, RECORDS).round(1)
+    return dates, values
+
+
+def objects(cls):
+    def create(dates, values):
+        return [cls(name="water_level", date=date, value=value, unit="cm", quality=2.0)
+                for date, value in zip(dates.to_pydatetime(), values.tolist())]
+    return create
+
+
+def batch(dates, values):
+    return GenericResponseBatch(name="water_level", unit="cm",
+                                dates=dates.tz_localize(None).to_numpy(dtype="datetime64[ns]"),
+                                values=values.copy(), qualities=np.full(len(values), 2.0))
+
+
+VARIANTS = {
+    "dataclass (__dict__)": objects(DictGenericResponseObject),
+    "dataclass (__slots__)": objects(GenericResponseObject),
+    "GenericResponseBatch": batch,
+}
+
+
+def main():
+    dates, values = columns()
+    print(f"{'variant':<22} {'bytes/record':>13} {'allocation time [ms]':>21}")
+    for name, create in VARIANTS.items():
+        # tracing slows down allocations, so the time is measured in a separate run
+        start = time.perf_counter()
+        result = create(dates, values)
+        elapsed = time.perf_counter() - start
+        del result
+        tracemalloc.start()
+        result = create(dates, values)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print(f"{name:<22} {size / RECORDS:>13.1f} {elapsed * 1000:>21.1f}")
+
+
+if __name__ == '__main__':
+    main()
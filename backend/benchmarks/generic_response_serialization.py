@@ -0,0 +1,74 @@
+"""
+Benchmark of the /actual/temperature-history serialization on 500k rows of
+synthetic 10-minute temperature observations (about 9.5 years).
+
+Compares the former path (one GenericResponseObject per row via iterrows,
+serialized with jsonify and the JSON provider of the app) with the columnar
+GenericResponseBatch.to_response_json and checks that both produce the same
+bytes.
+
+Run from the backend directory:
+    python -m benchmarks.generic_response_serialization
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+
+import benchmarks.flux_fixtures  # noqa: F401, sets the environment variables required by config
+from services.actual.objects.GenericResponseBatch import GenericResponseBatch
+from services.actual.objects.GenericResponseObject import GenericResponseObject
+from services.json_provider import OrjsonProvider
+
+ROWS = 500_000
+
+
+def observations(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        "station_id": "02712",
+        "dataset": "temperature_air",
+        "parameter": "temperature_air_mean_2m",
+        "date": pd.date_range("2015-01-01", periods=rows, freq="10min", tz="UTC"),
+        "value": np.round(rng.normal(10, 8, rows), 1),
+        "quality": 3.0,
+    })
+    # gaps in the observations
+    df.loc[rng.choice(rows, rows // 1000, replace=False), "value"] = np.nan
+    return df
+
+
+def iterrows_based(df: pd.DataFrame) -> bytes:
+    objects = [GenericResponseObject(
+        name="temperature_air",
+        date=pd.Timestamp(row["date"]).to_pydatetime(),
+        value=row["value"],
+        unit="°C",
+        quality=row["quality"]
+    ) for index, row in df.iterrows()]
+    return jsonify(objects).get_data()
+
+
+def columnar(df: pd.DataFrame) -> bytes:
+    return GenericResponseBatch.from_frame(df, "temperature_air", "°C").to_response_json()
+
+
+def main():
+    df = observations(ROWS)
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    with app.app_context():
+        results = {}
+        print(f"{'variant':<16} {'wall time [s]':>14}")
+        for name, serialize in [("iterrows-based", iterrows_based), ("columnar", columnar)]:
+            start = time.perf_counter()
+            results[name] = serialize(df)
+            print(f"{name:<16} {time.perf_counter() - start:>14.3f}")
+    print(f"identical output: {results['iterrows-based'] == results['columnar']} "
+          f"({len(results['columnar']) / 1024 ** 2:.1f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
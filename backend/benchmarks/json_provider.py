@@ -0,0 +1,58 @@
+"""
+Benchmark of the JSON provider of the app on /forecasts payloads.
+
+Encodes the records of a synthetic forecast (one run with 14 days of lead
+time, like a typical /forecasts request, and 14 days of hourly runs) with
+jsonify once with the default Flask provider and once with OrjsonProvider.
+
+Run from the backend directory:
+    python -m benchmarks.json_provider
+"""
+
+import time
+
+import pandas as pd
+from flask import Flask, jsonify
+
+from benchmarks.flux_fixtures import forecast_response
+from services.fog import add_fog
+from services.influx import _decode_annotated_csv
+from services.json_provider import OrjsonProvider
+
+REPEATS = 5
+
+
+def forecast_records(days: float, lead_hours: int) -> list[dict]:
+    df = pd.concat(list(_decode_annotated_csv(forecast_response(days=days, lead_hours=lead_hours))),
+                   ignore_index=True)
+    df["forecast_date"] = pd.to_datetime(df["forecast_date"])
+    return add_fog(df).to_dict(orient='records')
+
+
+def encode(app: Flask, records: list[dict]) -> tuple[float, int]:
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            body = jsonify(records).get_data()
+        return (time.perf_counter() - start) / REPEATS, len(body)
+
+
+def main():
+    default_app = Flask(__name__)
+    orjson_app = Flask(__name__)
+    orjson_app.json = OrjsonProvider(orjson_app)
+
+    payloads = [("one run, 14 days lead", 1 / 24, 336), ("14 days of runs, 48 h lead", 14, 48)]
+    for name, days, lead_hours in payloads:
+        records = forecast_records(days, lead_hours)
+        print(f"{name}: {len(records)} records")
+        print(f"  {'provider':<10} {'encode [ms]':>12} {'size [KiB]':>11}")
+        baseline = None
+        for provider, app in [("default", default_app), ("orjson", orjson_app)]:
+            elapsed, size = encode(app, records)
+            baseline = baseline or elapsed
+            print(f"  {provider:<10} {elapsed * 1000:>12.1f} {size / 1024:>11.1f}  {baseline / elapsed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
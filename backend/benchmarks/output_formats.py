@@ -0,0 +1,85 @@
+"""
+Benchmark of the response formats of the data endpoints: payload size,
+encoding time on the server and parse time into a DataFrame on the client.
+
+Uses a synthetic 30-day, all-field forecast (like /forecasts without field
+projection) and ten years of 15-minute water levels (like
+/archive/water-level).
+
+Run from the backend directory:
+    python -m benchmarks.output_formats
+"""
+
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from flask import Flask, jsonify
+
+from benchmarks.flux_fixtures import forecast_response
+from services.fog import add_fog
+from services.formats import ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE, CSV_MIMETYPE, encode_frame
+from services.influx import _decode_annotated_csv
+
+
+def forecasts() -> pd.DataFrame:
+    df = pd.concat(list(_decode_annotated_csv(forecast_response(days=30))), ignore_index=True)
+    df["forecast_date"] = pd.to_datetime(df["forecast_date"])
+    return add_fog(df)
+
+
+def water_levels() -> pd.DataFrame:
+    rows = 10 * 365 * 96
+    return pd.DataFrame({
+        "date": pd.date_range("2015-01-01", periods=rows, freq="15min", tz="UTC"),
+        "value": np.random.default_rng(42).normal(300, 20, rows).round(1),
+    })
+
+
+def parse_json(body: bytes) -> pd.DataFrame:
+    return pd.DataFrame(json.loads(body))
+
+
+def parse_arrow(body: bytes) -> pd.DataFrame:
+    return pa.ipc.open_stream(body).read_pandas()
+
+
+def parse_parquet(body: bytes) -> pd.DataFrame:
+    return pd.read_parquet(io.BytesIO(body))
+
+
+def parse_csv(body: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(body))
+
+
+FORMATS = {
+    "JSON": (lambda df: jsonify(df.to_dict(orient='records')).get_data(), parse_json),
+    "Arrow IPC": (lambda df: encode_frame(df, ARROW_STREAM_MIMETYPE), parse_arrow),
+    "Parquet": (lambda df: encode_frame(df, PARQUET_MIMETYPE), parse_parquet),
+    "CSV": (lambda df: encode_frame(df, CSV_MIMETYPE), parse_csv),
+}
+
+
+def main():
+    app = Flask(__name__)
+    with app.app_context():
+        for name, df in [("forecasts (30 days)", forecasts()), ("water levels (10 years)", water_levels())]:
+            print(f"{name}: {df.shape[0]} rows x {df.shape[1]} columns")
+            print(f"  {'format':<10} {'size [MiB]':>11} {'vs JSON':>8} {'encode [s]':>11} {'parse [s]':>10}")
+            json_size = None
+            for format_name, (encode, parse) in FORMATS.items():
+                start = time.perf_counter()
+                body = encode(df)
+                encoded = time.perf_counter()
+                parse(body)
+                parsed = time.perf_counter()
+                json_size = json_size or len(body)
+                print(f"  {format_name:<10} {len(body) / 1024 ** 2:>11.2f} {json_size / len(body):>7.1f}x "
+                      f"{encoded - start:>11.3f} {parsed - encoded:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of the response compression on JSON payloads: compressed size and
+compression time per content coding, and a repeated response served from the
+compressed body cache.
+
+Uses a synthetic 14-day, all-field forecast (like /forecasts) and one year of
+15-minute water levels (like /archive/water-level).
+
+Run from the backend directory:
+    python -m benchmarks.response_compression
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+
+from benchmarks.flux_fixtures import forecast_response
+from services.compression import ENCODINGS, CompressedBodyCache, compress
+from services.fog import add_fog
+from services.influx import _decode_annotated_csv
+from services.json_provider import OrjsonProvider
+
+
+def forecasts() -> pd.DataFrame:
+    df = pd.concat(list(_decode_annotated_csv(forecast_response(days=14))), ignore_index=True)
+    df["forecast_date"] = pd.to_datetime(df["forecast_date"])
+    return add_fog(df)
+
+
+def water_levels() -> pd.DataFrame:
+    rows = 365 * 96
+    return pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=rows, freq="15min", tz="UTC"),
+        "value": np.random.default_rng(42).normal(300, 20, rows).round(1),
+    })
+
+
+def main():
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    with app.app_context():
+        for name, df in [("forecasts (14 days)", forecasts()), ("water levels (1 year)", water_levels())]:
+            body = jsonify(df.to_dict(orient='records')).get_data()
+            print(f"{name}: {len(body) / 1024 ** 2:.2f} MiB JSON")
+            print(f"  {'encoding':<9} {'size [KiB]':>11} {'ratio':>7} {'compress [ms]':>14} {'cached [ms]':>12}")
+            cache = CompressedBodyCache(max_size=256 * 1024 ** 2)
+            for encoding in ENCODINGS:
+                start = time.perf_counter()
+                compressed = compress(body, encoding)
+                compressed_at = time.perf_counter()
+                cache.set("etag", encoding, compressed)
+                cached_at = time.perf_counter()
+                cache.get("etag", encoding)
+                hit = time.perf_counter() - cached_at
+                print(f"  {encoding:<9} {len(compressed) / 1024:>11.1f} {len(body) / len(compressed):>6.1f}x "
+                      f"{(compressed_at - start) * 1000:>14.1f} {hit * 1000:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
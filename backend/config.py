@@ -1,4 +1,5 @@
 import os
+import tempfile
 import influxdb_client
 
 INFLUXDB_ORG = "FogCast"
@@ -22,3 +23,87 @@ influx_client = influxdb_client.InfluxDBClient(
     verify_ssl=False,
     http_client_kwargs={"timeout": 300}
 )
+
+# directory for state shared between the gunicorn workers (cache files, locks)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "fogcast-cache"))
+# pickled cache files are loaded from CACHE_DIR, so nobody else may be able to place files in it
+os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+_cache_dir_stat = os.stat(CACHE_DIR)
+if _cache_dir_stat.st_uid != os.getuid() or _cache_dir_stat.st_mode & 0o022:
+    raise ValueError(f"CACHE_DIR '{CACHE_DIR}' must be owned by the user of the app and not writable by others")
+# backend of the response caches, either "memory" (per worker) or "file" (shared by all workers in CACHE_DIR)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# seconds until the available forecast models are queried again
+MODELS_CACHE_TTL = int(os.getenv("MODELS_CACHE_TTL", "3600"))
+# seconds until the time of the latest forecast run of a model is queried again
+INGEST_TIME_CACHE_TTL = int(os.getenv("INGEST_TIME_CACHE_TTL", "60"))
+
+# "sync" writes every weather station sample before answering, "async" queues it for a background writer
+STATION_INGEST_MODE = os.getenv("STATION_INGEST_MODE", "sync")
+STATION_INGEST_QUEUE_SIZE = int(os.getenv("STATION_INGEST_QUEUE_SIZE", "10000"))
+STATION_INGEST_BATCH_SIZE = int(os.getenv("STATION_INGEST_BATCH_SIZE", "500"))
+# seconds to wait for more samples before a batch is written
+STATION_INGEST_FLUSH_INTERVAL = float(os.getenv("STATION_INGEST_FLUSH_INTERVAL", "5"))
+STATION_INGEST_MAX_RETRIES = int(os.getenv("STATION_INGEST_MAX_RETRIES", "3"))
+# directory for samples that could not be written to InfluxDB, replayed after the next successful write
+STATION_INGEST_SPOOL_DIR = os.getenv("STATION_INGEST_SPOOL_DIR", "spool")
+
+# directory of the local Parquet cache for historical DWD observations
+DWD_CACHE_DIR = os.getenv("DWD_CACHE_DIR", "dwd-cache")
+# days after the end of a year until its DWD observations are considered final and cached
+DWD_CACHE_SETTLED_AFTER_DAYS = int(os.getenv("DWD_CACHE_SETTLED_AFTER_DAYS", "90"))
+# seconds until a settled year without DWD observations (e.g. before the station existed) is requested again
+DWD_CACHE_EMPTY_YEAR_TTL = int(os.getenv("DWD_CACHE_EMPTY_YEAR_TTL", "86400"))
+
+# seconds to wait for each upstream source of /actual/live-data before answering without it
+LIVE_DATA_DWD_TIMEOUT = float(os.getenv("LIVE_DATA_DWD_TIMEOUT", "20"))
+LIVE_DATA_PEGEL_ONLINE_TIMEOUT = float(os.getenv("LIVE_DATA_PEGEL_ONLINE_TIMEOUT", "10"))
+# seconds between two refreshes of the /actual/live-data snapshot, DWD and PegelOnline update every 10 minutes
+LIVE_DATA_REFRESH_INTERVAL = float(os.getenv("LIVE_DATA_REFRESH_INTERVAL", "600"))
+# seconds until a refresh in which a source failed is retried
+LIVE_DATA_RETRY_INTERVAL = float(os.getenv("LIVE_DATA_RETRY_INTERVAL", "60"))
+# seconds after which a value of the live data snapshot is reported as stale
+LIVE_DATA_MAX_AGE = float(os.getenv("LIVE_DATA_MAX_AGE", "1800"))
+
+# seconds after which archived measurements and forecasts no longer change, responses for older ranges are immutable
+HTTP_CACHE_SETTLED_AFTER = int(os.getenv("HTTP_CACHE_SETTLED_AFTER", "86400"))
+# Cache-Control max-age (seconds) of immutable responses and of responses that may still change
+HTTP_CACHE_IMMUTABLE_MAX_AGE = int(os.getenv("HTTP_CACHE_IMMUTABLE_MAX_AGE", "31536000"))
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+
+# responses smaller than this many bytes are not compressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# bytes of compressed response bodies kept per worker, so cached responses are compressed only once
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", str(64 * 1024 * 1024)))
+
+# seconds between two incremental updates of the water level rollups
+WATER_LEVEL_ROLLUP_INTERVAL = int(os.getenv("WATER_LEVEL_ROLLUP_INTERVAL", "3600"))
+# seconds after the end of a day until its water levels are rolled up, so late measurements are included
+WATER_LEVEL_ROLLUP_SETTLED_AFTER = int(os.getenv("WATER_LEVEL_ROLLUP_SETTLED_AFTER", "86400"))
+
+# seconds the latest model benchmark is cached at most, every scoring run drops it right away
+BENCHMARK_CACHE_TTL = int(os.getenv("BENCHMARK_CACHE_TTL", "3600"))
+
+# worker processes of a forecast scoring run, every worker scores one chunk of days at a time
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "4"))
+# days before the current hour scored by a scoring run without --start, long enough that hours whose DWD
+# observations are published a day or more late are still scored once they are complete
+SCORING_DEFAULT_DAYS = int(os.getenv("SCORING_DEFAULT_DAYS", "3"))
+
+# connection pools (hosts) and kept-alive connections per host of the upstream HTTP session of every worker
+UPSTREAM_HTTP_POOL_CONNECTIONS = int(os.getenv("UPSTREAM_HTTP_POOL_CONNECTIONS", "8"))
+UPSTREAM_HTTP_POOL_MAXSIZE = int(os.getenv("UPSTREAM_HTTP_POOL_MAXSIZE", "8"))
+# retries of failed upstream requests and the backoff factor (seconds) between them
+UPSTREAM_HTTP_MAX_RETRIES = int(os.getenv("UPSTREAM_HTTP_MAX_RETRIES", "3"))
+UPSTREAM_HTTP_BACKOFF_FACTOR = float(os.getenv("UPSTREAM_HTTP_BACKOFF_FACTOR", "0.3"))
+# connect and read timeout (seconds) of upstream hosts without their own timeouts
+UPSTREAM_HTTP_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_HTTP_CONNECT_TIMEOUT", "3.05"))
+UPSTREAM_HTTP_READ_TIMEOUT = float(os.getenv("UPSTREAM_HTTP_READ_TIMEOUT", "30"))
+
+# bytes of OpenMeteo archive responses cached in CACHE_DIR, shared by all workers, least recently used ones are removed
+OPENMETEO_CACHE_SIZE = int(os.getenv("OPENMETEO_CACHE_SIZE", str(256 * 1024 * 1024)))
+# days until OpenMeteo no longer revises the archived data of a day
+OPENMETEO_RECENT_DAYS = int(os.getenv("OPENMETEO_RECENT_DAYS", "7"))
+# seconds the archived data of older days and of recent days, which may still be revised, are cached
+OPENMETEO_ARCHIVE_TTL = int(os.getenv("OPENMETEO_ARCHIVE_TTL", str(30 * 24 * 60 * 60)))
+OPENMETEO_RECENT_TTL = int(os.getenv("OPENMETEO_RECENT_TTL", "3600"))
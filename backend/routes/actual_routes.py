@@ -1,13 +1,21 @@
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import pytz
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 
+from config import DWD_CACHE_SETTLED_AFTER_DAYS, HTTP_CACHE_SETTLED_AFTER
 from services.actual.DWD import DWD
 from services.actual.PegelOnline import PegelOnline
-from services.actual.OpenMeteo import OpenMeteo
-from services.influx import get_archive_water_level, get_monthly_averaged_water_level, get_yearly_averaged_water_level, get_weekly_averaged_water_level, get_daily_averaged_water_level
+from services.actual.OpenMeteo import OpenMeteo, archive_cache
+from services.actual.live_data import live_data_snapshot
+from services.water_level_rollups import water_level_rollups
+from services.influx import get_archive_water_level, get_monthly_averaged_water_level, get_yearly_averaged_water_level, get_weekly_averaged_water_level, get_daily_averaged_water_level, \
+    stream_water_level, WATER_LEVEL_PERIODS
+from services.streaming import get_stream_mimetype, encode_frames, stream_response, NDJSON_MIMETYPE
+from services.formats import get_columnar_mimetype, frame_response
+from services.http_caching import is_settled, request_etag, not_modified, with_cache_headers
+from services.auth import require_api_key
 
 actual_bp = Blueprint('actual', __name__)
 
@@ -17,20 +25,18 @@ pegel_online = PegelOnline()
 
 @actual_bp.route('/actual/live-data', methods=['GET'])
 def actual_live_data():
-    try:
-        dwd_measurements = dwd.get_real_time_data()
-        # current default station is Konstanz Rhein
-        pegel_online_measurements = pegel_online.get_water_level_measurements(
-            PegelOnline.Period.last_24_hours, PegelOnline.Station.KONSTANZ_RHEIN)
-        pegel_online_measurements = sorted(
-            pegel_online_measurements, key=lambda x: x.date, reverse=True)[0]
-        result = [entry.to_json() for entry in dwd_measurements +
-                  [pegel_online_measurements]]
-        return jsonify(result)
-    except Exception as e:
-        logging.exception(
-            "Error occurred while fetching actual data:", exc_info=e)
-        return jsonify({"error": str(e)}), 500
+    snapshot = live_data_snapshot.get(current_app.json.dumps)
+    if snapshot is None:
+        return jsonify({"error": "No live data source answered yet"}), 502
+    body, age, failed_sources = snapshot
+    response = current_app.response_class(body, mimetype="application/json")
+    # seconds since the oldest measurements were fetched, the snapshot is refreshed in the background
+    response.headers["X-Data-Age"] = str(int(age))
+    response.headers["X-Data-Stale"] = "true" if live_data_snapshot.is_stale(age) else "false"
+    if failed_sources:
+        # partial result, the sources without any measurements are listed in a header
+        response.headers["X-Failed-Sources"] = ",".join(failed_sources)
+    return response
 
 
 @actual_bp.route('/actual/temperature-history', methods=['GET'])
@@ -60,7 +66,23 @@ def actual_temperature_history():
             frequency = DWD.Frequency.ten_minutes
         else:
             return jsonify({"error": "frequency must be daily, hourly or 10-minutes"}), 400
-        return jsonify([x for x in dwd.get_temperature(start, stop, frequency)])
+
+        stream_mimetype = get_stream_mimetype(request)
+        # DWD revises observations for a while, like the DWD history cache they are final after some days
+        immutable = is_settled(stop, timedelta(days=DWD_CACHE_SETTLED_AFTER_DAYS))
+        etag = request_etag(request, stream_mimetype) if immutable else None
+        if etag is not None:
+            response = not_modified(request, etag, immutable=True, mimetype=stream_mimetype)
+            if response is not None:
+                return response
+
+        batch = dwd.get_temperature(start, stop, frequency)
+        if stream_mimetype:
+            response = stream_response(batch.iter_response_json(ndjson=stream_mimetype == NDJSON_MIMETYPE),
+                                       stream_mimetype)
+        else:
+            response = current_app.response_class(batch.to_response_json(), mimetype="application/json")
+        return with_cache_headers(request, response, etag, immutable=immutable)
     else:
         return jsonify({"error": "start, stop and frequency are required parameters"}), 400
 
@@ -83,8 +105,16 @@ def actual_weather_archive():
         return jsonify({"error": "date and model_id are required parameters"}), 400
 
 
+@actual_bp.route('/actual/archive/cache-metrics', methods=['GET'])
+@require_api_key
+def actual_weather_archive_cache_metrics():
+    return jsonify(archive_cache.metrics())
+
+
 @actual_bp.route('/archive/water-level', methods=['GET'])
 def archive_water_level():
+    # keeps the rollups the averaged water levels are read from up to date
+    water_level_rollups.ensure_started()
     try:
         # Validate and parse 'start' parameter
         start = request.args.get('start')
@@ -114,6 +144,26 @@ def archive_water_level():
 
         # Validate and parse 'period' parameter
         period = request.args.get('period')
+        if period and period not in WATER_LEVEL_PERIODS:
+            return jsonify({"error": "period must be either 'y' (yearly), 'm' (monthly), 'w' (weekly) or 'd' (daily)"}), 400
+
+        columnar_mimetype = get_columnar_mimetype(request)
+        stream_mimetype = get_stream_mimetype(request)
+        # water levels of a range that ended long enough ago no longer change
+        immutable = is_settled(stop, timedelta(seconds=HTTP_CACHE_SETTLED_AFTER))
+        etag = request_etag(request, columnar_mimetype, stream_mimetype) if immutable else None
+        if etag is not None:
+            response = not_modified(request, etag, immutable=True,
+                                    mimetype=columnar_mimetype or stream_mimetype)
+            if response is not None:
+                return response
+
+        if stream_mimetype and not columnar_mimetype:
+            frames = stream_water_level(station_id, start, stop, period)
+            response = stream_response(encode_frames(frames, current_app.json.dumps, stream_mimetype),
+                                       stream_mimetype)
+            return with_cache_headers(request, response, etag, immutable=immutable)
+
         if period:
             if period == "y":
                 df = get_yearly_averaged_water_level(station_id, start, stop)
@@ -128,8 +178,12 @@ def archive_water_level():
         else:
             df = get_archive_water_level(station_id, start, stop)
 
-        # Return the data as JSON
-        return jsonify(df.to_dict(orient='records'))
+        if columnar_mimetype:
+            response = frame_response(df, columnar_mimetype)
+        else:
+            # Return the data as JSON
+            response = jsonify(df.to_dict(orient='records'))
+        return with_cache_headers(request, response, etag, immutable=immutable)
 
     except ValueError as e:
         return jsonify({"error": f"Invalid date format: {str(e)}"}), 400
@@ -164,7 +218,17 @@ def actual_fog_count_history():
             frequency = DWD.Frequency.yearly
         else:
             return jsonify({"error": "frequency must be either monthly or yearly"}), 400
-        return jsonify([x for x in dwd.get_fog_count(start, stop, frequency)])
+
+        immutable = is_settled(stop, timedelta(days=DWD_CACHE_SETTLED_AFTER_DAYS))
+        etag = request_etag(request) if immutable else None
+        if etag is not None:
+            response = not_modified(request, etag, immutable=True)
+            if response is not None:
+                return response
+
+        response = current_app.response_class(dwd.get_fog_count(start, stop, frequency).to_response_json(),
+                                              mimetype="application/json")
+        return with_cache_headers(request, response, etag, immutable=immutable)
     else:
         return jsonify({"error": "start, stop and frequency are required parameters"}), 400
 
@@ -185,7 +249,7 @@ def actual_water_level():
         try:
             data = pegel_online.get_water_level_measurements(
                 PegelOnline.Period.last_31_days, station_id)
-            return jsonify([entry for entry in data])
+            return current_app.response_class(data.to_response_json(), mimetype="application/json")
         except BaseException as e:
             # Explicitly return a response
             return jsonify({"error": str(e)}), 500
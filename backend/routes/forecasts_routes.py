@@ -1,7 +1,12 @@
-from flask import Blueprint, jsonify, request
-from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
+from datetime import datetime, timedelta
+import re
 import pytz
-from services.influx import get_forecasts, get_current_forecast
+from config import HTTP_CACHE_SETTLED_AFTER
+from services.influx import MAX_LEAD_HOURS, get_forecasts, get_current_forecast_json, get_current_forecasts, \
+    get_current_forecast, get_cached_ingest_time
+from services.formats import get_columnar_mimetype, frame_response
+from services.http_caching import is_settled, request_etag, not_modified, with_cache_headers
 import logging
 
 forecasts_bp = Blueprint('forecasts', __name__)
@@ -23,9 +28,34 @@ def forecasts():
     except ValueError:
         return jsonify({"error": "datetime must be in the format YYYY-MM-DDTHH:MM:SSZ"}), 400
 
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        if not fields or not all(re.fullmatch(r'\w+', field) for field in fields):
+            return jsonify({"error": "fields must be a comma separated list of field names"}), 400
+
+    max_lead = request.args.get('max_lead')
+    if max_lead is not None:
+        if not max_lead.isdigit() or not 0 < int(max_lead) <= MAX_LEAD_HOURS:
+            return jsonify({"error": f"max_lead must be an integer between 1 and {MAX_LEAD_HOURS} (hours)"}), 400
+        max_lead = int(max_lead)
+
+    columnar_mimetype = get_columnar_mimetype(request)
+    # forecast runs are written before the forecast date, so the forecasts of past dates no longer change
+    immutable = is_settled(forecast_datetime, timedelta(seconds=HTTP_CACHE_SETTLED_AFTER))
+    etag = request_etag(request, columnar_mimetype) if immutable else None
+    if etag is not None:
+        response = not_modified(request, etag, immutable=True, mimetype=columnar_mimetype)
+        if response is not None:
+            return response
+
     try:
-        df = get_forecasts(model_id, forecast_datetime)
-        return jsonify(df.to_dict(orient='records'))
+        df = get_forecasts(model_id, forecast_datetime, fields, max_lead)
+        if columnar_mimetype:
+            response = frame_response(df, columnar_mimetype)
+        else:
+            response = jsonify(df.to_dict(orient='records'))
+        return with_cache_headers(request, response, etag, immutable=immutable)
 
     except KeyError as e:
         logging.exception(
@@ -46,8 +76,47 @@ def current_forecast():
         return jsonify({"error": "model_id is a required parameter"}), 400
 
     try:
-        df = get_current_forecast(model_id)
-        return jsonify(df.to_dict(orient='records'))
+        columnar_mimetype = get_columnar_mimetype(request)
+        etag = last_modified = None
+        ingest_time = get_cached_ingest_time(model_id)
+        if ingest_time is not None:
+            # the response changes with every forecast run and every hour, when the past hour is dropped
+            hour = datetime.now(pytz.utc).replace(minute=0, second=0, microsecond=0)
+            last_modified = max(ingest_time.to_pydatetime(), hour)
+            etag = request_etag(request, columnar_mimetype, ingest_time.isoformat(), hour.isoformat())
+            response = not_modified(request, etag, last_modified, mimetype=columnar_mimetype)
+            if response is not None:
+                return response
+
+        if columnar_mimetype:
+            response = frame_response(get_current_forecast(model_id), columnar_mimetype)
+        else:
+            body = get_current_forecast_json(model_id, current_app.json.dumps)
+            response = current_app.response_class(body, mimetype="application/json")
+        return with_cache_headers(request, response, etag, last_modified)
+
+    except ValueError as e:
+        logging.error(e)
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        logging.exception(
+            "Error occurred while querying InfluxDB for forecasts:", exc_info=e)
+        return jsonify({"error": str(e)}), 500
+
+
+@forecasts_bp.route('/current-forecast/batch', methods=['GET'])
+def current_forecast_batch():
+    model_ids = request.args.getlist('model_id')
+
+    if not model_ids:
+        return jsonify({"error": "model_id is a required parameter"}), 400
+    if "all" in model_ids:
+        model_ids = None
+
+    try:
+        forecasts = get_current_forecasts(model_ids)
+        return jsonify({model: df.to_dict(orient='records') for model, df in forecasts.items()})
 
     except ValueError as e:
         logging.error(e)
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
-from services.influx import get_models
+from services.auth import require_api_key
+from services.influx import get_models, tag_values_cache
 import logging
 
 models_bp = Blueprint('models', __name__)
@@ -14,3 +15,10 @@ def models():
         logging.exception(
             "Error occurred while querying InfluxDB for tag values:", exc_info=e)
         return jsonify({"error": str(e)}), 500
+
+
+@models_bp.route("/models/cache", methods=['DELETE'])
+@require_api_key
+def invalidate_models_cache():
+    tag_values_cache.invalidate()
+    return jsonify({"message": "Cache invalidated successfully"}), 200
@@ -1,9 +1,16 @@
+import json
+import queue
 from datetime import datetime
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 import pytz
 import logging
 
-from services.raspi_station import save_station_data_to_influxdb, get_station_data_from_influxdb
+from config import STATION_INGEST_MODE
+from services.raspi_station import save_station_data_to_influxdb, get_station_data_from_influxdb, create_station_point, \
+    save_bulk_station_data_to_influxdb, stream_station_data_from_influxdb, get_station_data_frame_from_influxdb
+from services.streaming import get_stream_mimetype, encode_frames, stream_response
+from services.formats import get_columnar_mimetype, frame_response
+from services.station_ingest import station_ingest
 from services.auth import require_api_key
 
 weatherstation_bp = Blueprint('weatherstation', __name__)
@@ -15,6 +22,16 @@ def post_station_data():
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
+
+    if STATION_INGEST_MODE == "async":
+        try:
+            station_ingest.submit(create_station_point(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except queue.Full:
+            return jsonify({"error": "Ingest queue is full, retry later"}), 503
+        return jsonify({"message": "Data accepted"}), 202
+
     try:
         save_station_data_to_influxdb(data)
     except ValueError as e:
@@ -22,6 +39,37 @@ def post_station_data():
     return jsonify({"message": "Data received successfully"}), 200
 
 
+@weatherstation_bp.route('/weatherstation/bulk', methods=['POST'])
+@require_api_key
+def post_bulk_station_data():
+    if request.mimetype == 'application/x-ndjson':
+        try:
+            samples = [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+        except ValueError:
+            return jsonify({"error": "Every line must be a JSON object"}), 400
+    else:
+        samples = request.get_json(silent=True)
+
+    if not isinstance(samples, list) or not samples:
+        return jsonify({"error": "Data must be a non-empty JSON array or NDJSON stream"}), 400
+
+    try:
+        written, errors = save_bulk_station_data_to_influxdb(samples)
+    except Exception as e:
+        logging.exception(
+            "Error occurred while writing station data to InfluxDB:", exc_info=e)
+        return jsonify({"error": str(e)}), 500
+
+    status = 200 if written else 400
+    return jsonify({"written": written, "errors": errors}), status
+
+
+@weatherstation_bp.route('/weatherstation/ingest/metrics', methods=['GET'])
+@require_api_key
+def get_ingest_metrics():
+    return jsonify(station_ingest.metrics())
+
+
 @weatherstation_bp.route('/weatherstation', methods=['GET'])
 def get_station_data():
     start = request.args.get('start')
@@ -43,6 +91,13 @@ def get_station_data():
         return jsonify({"error": "stop must be in the format format YYYY-MM-DDTHH:MM:SSZ"}), 400
 
     try:
+        columnar_mimetype = get_columnar_mimetype(request)
+        if columnar_mimetype:
+            return frame_response(get_station_data_frame_from_influxdb(start, stop), columnar_mimetype)
+        stream_mimetype = get_stream_mimetype(request)
+        if stream_mimetype:
+            frames = stream_station_data_from_influxdb(start, stop)
+            return stream_response(encode_frames(frames, current_app.json.dumps, stream_mimetype), stream_mimetype)
         data = get_station_data_from_influxdb(start, stop)
         return jsonify(data)
     except Exception as e:
@@ -5,37 +5,12 @@ import pandas as pd
 from wetterdienst import Settings, Period
 from wetterdienst.provider.dwd.observation import DwdObservationRequest
 
+from config import DWD_CACHE_DIR, DWD_CACHE_SETTLED_AFTER_DAYS, DWD_CACHE_EMPTY_YEAR_TTL
+from .DwdHistoryCache import DwdHistoryCache
+from .objects.GenericResponseBatch import GenericResponseBatch
 from .objects.GenericResponseObject import GenericResponseObject
 
 
-def df_to_generic_response_object(df: pd.DataFrame, occurrence_name: str, unit: str):
-    """
-    Converts a pandas DataFrame containing weather-related data into a list of
-    GenericResponseObject, where each object represents a row in the DataFrame.
-
-    The method ensures that each row of the provided DataFrame is translated
-    into a generic, structured response object, using specific columns from
-    the DataFrame for attributes such as date, value, and quality.
-
-    Parameters:
-        df (pd.DataFrame): The DataFrame containing weather data, which must
-            include "date", "value", and "quality" columns.
-        occurrence_name (str): The name associated with the occurrence or
-            dataset for which the data is being processed.
-
-    Returns:
-        list[GenericResponseObject]: A list of objects representing each row
-            of the DataFrame in a structured, generic response format.
-    """
-    return [GenericResponseObject(
-        name=occurrence_name,
-        date=pd.Timestamp(row["date"]).to_pydatetime(),
-        value=row["value"],
-        unit=unit,
-        quality=row["quality"]
-    ) for index, row in df.iterrows()]
-
-
 class DWD:
     """
     Class to interact with the DWD API to get actual weather data for the station in Konstanz.
@@ -50,6 +25,8 @@ class DWD:
         self.date_str_format = r"%Y-%m-%d"
         # Station ID for Konstanz DWD station
         self.station_id = 2712
+        # local cache of the historical observations
+        self.history_cache = DwdHistoryCache(DWD_CACHE_DIR, DWD_CACHE_SETTLED_AFTER_DAYS, DWD_CACHE_EMPTY_YEAR_TTL)
 
     class Frequency(Enum):
         ten_minutes = "10_minutes"
@@ -71,6 +48,9 @@ class DWD:
         wind_speed = "wind_speed"
         fog_count = "count_weather_type_fog"
         temperature = "temperature_air_mean_2m"
+        dew_point = "temperature_dew_point_mean_2m"
+        precipitation = "precipitation_height"
+        pressure = "pressure_air_site"
 
     class Dataset(Enum):
         """
@@ -81,6 +61,9 @@ class DWD:
         temperature_air = "temperature_air"
         wind = "wind"
         precipitation = "precipitation"
+        dew_point = "dew_point"
+        cloudiness = "cloudiness"
+        pressure = "pressure"
 
     class Unit(Enum):
         """
@@ -93,13 +76,13 @@ class DWD:
         humidity = "%"
         air_pressure = "hPa"
 
-    def get_temperature(self, utc_start: datetime, utc_end: datetime, frequency: Frequency) -> list[
-        GenericResponseObject]:
+    def get_temperature(self, utc_start: datetime, utc_end: datetime, frequency: Frequency) -> GenericResponseBatch:
         """
         Retrieves temperature data based on the specified time range and frequency. The method
         supports fetching data in daily or hourly intervals, aligning with the parameters and
-        datasets for each respective frequency. The response is formatted into a list of
-        GenericResponseObject for consistency and ease of further processing.
+        datasets for each respective frequency. The response is formatted into a
+        GenericResponseBatch, which holds the columns of the data and serializes them
+        like a list of GenericResponseObject.
 
         Parameters:
             utc_start (datetime): The start of the time range for which temperature data
@@ -110,8 +93,8 @@ class DWD:
                 Can either be daily or hourly.
 
         Returns:
-            list[GenericResponseObject]: A list of GenericResponseObject containing the
-                retrieved temperature data aligned with the specified request parameters.
+            GenericResponseBatch: A GenericResponseBatch containing the retrieved
+                temperature data aligned with the specified request parameters.
 
         Raises:
             NotImplementedError: Raised if the provided frequency is not supported.
@@ -119,27 +102,26 @@ class DWD:
         """
         if frequency == self.Frequency.daily:
 
-            request = self.__create_dwd_historical_observation_request(parameters=self.Params.temperature,
-                                                                       dataset=self.Dataset.climate_summary,
-                                                                       frequency=self.Frequency.daily,
-                                                                       start_date=utc_start, end_date=utc_end)
-            return df_to_generic_response_object(request.values.all().df.to_pandas(), "temperature_air", self.Unit.temperature.value)
+            df = self.__get_historical_observations(parameters=self.Params.temperature,
+                                                    dataset=self.Dataset.climate_summary,
+                                                    frequency=self.Frequency.daily,
+                                                    start_date=utc_start, end_date=utc_end)
+            return GenericResponseBatch.from_frame(df, "temperature_air", self.Unit.temperature.value)
         elif frequency == self.Frequency.hourly or frequency == self.Frequency.ten_minutes:
-            request = self.__create_dwd_historical_observation_request(parameters=self.Params.temperature,
-                                                                       dataset=self.Dataset.temperature_air,
-                                                                       frequency=frequency, start_date=utc_start,
-                                                                       end_date=utc_end)
-            return df_to_generic_response_object(request.values.all().df.to_pandas(), "temperature_air", self.Unit.temperature.value)
+            df = self.__get_historical_observations(parameters=self.Params.temperature,
+                                                    dataset=self.Dataset.temperature_air,
+                                                    frequency=frequency, start_date=utc_start,
+                                                    end_date=utc_end)
+            return GenericResponseBatch.from_frame(df, "temperature_air", self.Unit.temperature.value)
         else:
             raise NotImplementedError("Only daily and hourly requests are supported for temperature yet.")
 
-    def get_fog_count(self, utc_start: datetime, utc_end: datetime, frequency: Frequency) -> list[
-        GenericResponseObject]:
+    def get_fog_count(self, utc_start: datetime, utc_end: datetime, frequency: Frequency) -> GenericResponseBatch:
         """
         Fetches the fog count data within a specified date range and at a specified frequency
         (monthly or yearly) from the DWD observation dataset. The method constructs an
         observation request based on the parameters and processes the retrieved data into a
-        list of GenericResponseObject instances. For now, only monthly and yearly frequency
+        GenericResponseBatch. For now, only monthly and yearly frequency
         requests are supported; any other frequency will result in a NotImplementedError being raised.
 
         Args:
@@ -149,20 +131,59 @@ class DWD:
                 Frequency.monthly or Frequency.yearly.
 
         Returns:
-            list[GenericResponseObject]: A list containing the processed fog count aggregated
+            GenericResponseBatch: The processed fog count aggregated
             as per the requested frequency.
 
         Raises:
             NotImplementedError: If frequency is not monthly or yearly.
         """
         if frequency == self.Frequency.monthly or frequency == self.Frequency.yearly:
-            request = self.__create_dwd_historical_observation_request(self.Params.fog_count,
-                                                                       self.Dataset.weather_phenomena, frequency,
-                                                                       utc_start, utc_end)
-            return df_to_generic_response_object(request.values.all().df.to_pandas(), "days_with_fog", self.Unit.no_unit.value)
+            df = self.__get_historical_observations(self.Params.fog_count, self.Dataset.weather_phenomena,
+                                                    frequency, utc_start, utc_end)
+            return GenericResponseBatch.from_frame(df, "days_with_fog", self.Unit.no_unit.value)
         else:
             raise NotImplementedError("Only monthly and yearly requests are supported for fog_count yet.")
 
+    def get_hourly_observations(self, parameters: Params, dataset: Dataset, utc_start: datetime,
+                                utc_end: datetime) -> pd.DataFrame:
+        """
+        Retrieves the hourly observations of a single parameter, in the units
+        converted by wetterdienst (fractions like the humidity as decimals).
+
+        Parameters:
+            parameters (Params): The parameter of the requested observations.
+            dataset (Dataset): The hourly dataset containing the parameter.
+            utc_start (datetime): The first day of the requested range (UTC).
+            utc_end (datetime): The last day of the requested range (UTC, inclusive).
+
+        Returns:
+            pd.DataFrame: The observations with "date", "value" and "quality" columns.
+        """
+        return self.__get_historical_observations(parameters, dataset, self.Frequency.hourly, utc_start, utc_end)
+
+    def __get_historical_observations(self, parameters: Params, dataset: Dataset, frequency: Frequency,
+                                      start_date: datetime, end_date: datetime) -> pd.DataFrame:
+        """
+        Gets historical observations through the local history cache, which only
+        requests the years from DWD that are not cached yet.
+
+        Parameters:
+            parameters (Params): The parameter of the requested observations.
+            dataset (Dataset): The dataset of the requested observations.
+            frequency (Frequency): The frequency of the requested observations.
+            start_date (datetime): The starting date for the observation period.
+            end_date (datetime): The ending date for the observation period.
+
+        Returns:
+            pd.DataFrame: The observations with "date", "value" and "quality" columns.
+        """
+        def fetch(start: datetime, end: datetime):
+            return self.__create_dwd_historical_observation_request(parameters, dataset, frequency, start,
+                                                                    end).values.all().df
+
+        return self.history_cache.get(dataset.value, frequency.value, parameters.value, start_date, end_date,
+                                      fetch).to_pandas()
+
     def __create_dwd_historical_observation_request(self, parameters: Params, dataset: Dataset, frequency: Frequency,
                                                     start_date: datetime, end_date: datetime, ):
         """
@@ -207,74 +228,61 @@ class DWD:
         return DwdObservationRequest(parameters=[frequency.value, dataset.value], periods=Period.NOW.value,
                                      settings=self.settings, ).filter_by_station_id(station_id=(self.station_id,))
 
+    def get_real_time_wind(self) -> list[GenericResponseObject]:
+        """
+        Gets the latest wind direction and speed from the DWD API.
+        """
+        latest = self.__get_latest_live_values(self.Dataset.wind)
+        return [
+            self.__to_generic_response_object(latest, "wind_direction", "wind_direction", self.Unit.wind_direction),
+            self.__to_generic_response_object(latest, "wind_speed", "wind_speed", self.Unit.wind_speed),
+        ]
+
+    def get_real_time_precipitation(self) -> list[GenericResponseObject]:
+        """
+        Gets the latest precipitation indicator (0.0 or 1.0) from the DWD API.
+        """
+        latest = self.__get_latest_live_values(self.Dataset.precipitation)
+        precipitation_indicator = self.__to_generic_response_object(latest, "precipitation_index",
+                                                                    "precipitation_indicator", self.Unit.no_unit)
+        precipitation_indicator.value = 0.0 if precipitation_indicator.value == 0.0 else 1.0
+        return [precipitation_indicator]
+
+    def get_real_time_climate(self) -> list[GenericResponseObject]:
+        """
+        Gets the latest humidity, air pressure and temperature from the DWD API.
+        """
+        latest = self.__get_latest_live_values(self.Dataset.temperature_air)
+        return [
+            self.__to_generic_response_object(latest, "humidity", "humidity", self.Unit.humidity),
+            self.__to_generic_response_object(latest, "pressure_air_site", "air_pressure", self.Unit.air_pressure),
+            self.__to_generic_response_object(latest, "temperature_air_mean_2m", "temperature",
+                                              self.Unit.temperature),
+        ]
+
     def get_real_time_data(self):
         """
         Gets real-time weather data from the DWD API.
         """
-        result: list = []
-        # get wind direction and speed
-        request = self.__create_dwd_live_observation_request(dataset=self.Dataset.wind,
-                                                             frequency=self.Frequency.ten_minutes)
-        wind_data = request.values.all().df.to_pandas()
-        latest_wind_direction = wind_data[wind_data["parameter"] == "wind_direction"].nlargest(1, "date")
-        latest_wind_speed = wind_data[wind_data["parameter"] == "wind_speed"].nlargest(1, "date")
-        result.append(GenericResponseObject(
-            name="wind_direction",
-            date=latest_wind_direction["date"].values[0].item(),
-            value=latest_wind_direction["value"].values[0],
-            unit=self.Unit.wind_direction.value,
-            quality=latest_wind_direction["quality"].values[0],
-        ))
-        result.append(GenericResponseObject(
-            name="wind_speed",
-            date=latest_wind_speed["date"].values[0].item(),
-            value=latest_wind_speed["value"].values[0],
-            unit=self.Unit.wind_speed.value,
-            quality=latest_wind_speed["quality"].values[0],
-        ))
-
-        # get precipitation indicator
-        request = self.__create_dwd_live_observation_request(dataset=self.Dataset.precipitation,
-                                                             frequency=self.Frequency.ten_minutes)
-        precipitation_data = request.values.all().df.to_pandas()
-        precipitation_indicator = precipitation_data[precipitation_data["parameter"] == "precipitation_index"].nlargest(
-            1, "date")
-        precipitation_indicator_value = 0.0 if precipitation_indicator["value"].values[0] == 0.0 else 1.0
-        result.append(GenericResponseObject(
-            name="precipitation_indicator",
-            date=precipitation_indicator["date"].values[0].item(),
-            value=precipitation_indicator_value,
-            unit=self.Unit.no_unit.value,
-            quality=precipitation_indicator["quality"].values[0],
-        ))
-
-        # get humidity, air-pressure and temperature
-        request = self.__create_dwd_live_observation_request(dataset=self.Dataset.temperature_air,
-                                                             frequency=self.Frequency.ten_minutes)
-        climate_data = request.values.all().df.to_pandas()
-        humidity = climate_data[climate_data["parameter"] == "humidity"].nlargest(1, "date")
-        air_pressure = climate_data[climate_data["parameter"] == "pressure_air_site"].nlargest(1, "date")
-        temperature = climate_data[climate_data["parameter"] == "temperature_air_mean_2m"].nlargest(1, "date")
-        result.append(GenericResponseObject(
-            name="humidity",
-            date=humidity["date"].values[0].item(),
-            value=humidity["value"].values[0],
-            unit=self.Unit.humidity.value,
-            quality=humidity["quality"].values[0],
-        ))
-        result.append(GenericResponseObject(
-            name="air_pressure",
-            date=air_pressure["date"].values[0].item(),
-            value=air_pressure["value"].values[0],
-            unit=self.Unit.air_pressure.value,
-            quality=air_pressure["quality"].values[0],
-        ))
-        result.append(GenericResponseObject(
-            name="temperature",
-            date=temperature["date"].values[0].item(),
-            value=temperature["value"].values[0],
-            unit=self.Unit.temperature.value,
-            quality=temperature["quality"].values[0],
-        ))
-
-        return result
+        return self.get_real_time_wind() + self.get_real_time_precipitation() + self.get_real_time_climate()
+
+    def __get_latest_live_values(self, dataset: Dataset) -> pd.DataFrame:
+        """
+        Gets the latest 10-minute observation of every parameter of a dataset,
+        indexed by the parameter name.
+        """
+        request = self.__create_dwd_live_observation_request(dataset=dataset, frequency=self.Frequency.ten_minutes)
+        df = request.values.all().df.to_pandas()
+        # one pass over the frame instead of filtering and sorting it for every parameter
+        return df.loc[df.groupby("parameter")["date"].idxmax()].set_index("parameter")
+
+    @staticmethod
+    def __to_generic_response_object(latest: pd.DataFrame, parameter: str, name: str,
+                                     unit: Unit) -> GenericResponseObject:
+        return GenericResponseObject(
+            name=name,
+            date=pd.Timestamp(latest.at[parameter, "date"]).to_pydatetime(),
+            value=latest.at[parameter, "value"],
+            unit=unit.value,
+            quality=latest.at[parameter, "quality"],
+        )
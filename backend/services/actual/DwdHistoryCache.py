@@ -0,0 +1,125 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+import polars as pl
+import pytz
+
+
+class DwdHistoryCache:
+    """
+    Local Parquet cache of historical DWD observations.
+
+    Observations are stored in one file per dataset, frequency, parameter and
+    year (`dataset=<dataset>/frequency=<frequency>/parameter=<parameter>/year=<year>.parquet`).
+    A year is only stored once it ended more than `settled_after_days` days ago,
+    because DWD still revises recent observations. A settled year without
+    observations is only marked as empty (`year=<year>.empty`) for
+    `empty_year_ttl` seconds, as it may as well be a DWD outage. Requests are
+    served from the stored years and only missing or not yet settled years are
+    fetched.
+    """
+
+    def __init__(self, directory: str, settled_after_days: int, empty_year_ttl: float = 24 * 60 * 60):
+        self.directory = directory
+        self.settled_after_days = settled_after_days
+        self.empty_year_ttl = empty_year_ttl
+
+    def get(self, dataset: str, frequency: str, parameter: str, start: datetime, end: datetime,
+            fetch: Callable[[datetime, datetime], pl.DataFrame]) -> pl.DataFrame:
+        """
+        Returns the observations from the start day of `start` until the start
+        day of `end` (inclusive).
+
+        Parameters:
+            dataset (str): The DWD dataset, part of the partition path.
+            frequency (str): The DWD frequency, part of the partition path.
+            parameter (str): The DWD parameter, part of the partition path.
+            start (datetime): The start of the requested range.
+            end (datetime): The end of the requested range.
+            fetch (Callable): Fetches the observations from DWD for a range of days
+                (start and end inclusive, like the DWD request).
+
+        Returns:
+            pl.DataFrame: The observations in the requested range, ordered by date.
+        """
+        start = datetime(start.year, start.month, start.day, tzinfo=pytz.utc)
+        end = datetime(end.year, end.month, end.day, tzinfo=pytz.utc)
+        partition_dir = os.path.join(self.directory, f"dataset={dataset}", f"frequency={frequency}",
+                                     f"parameter={parameter}")
+        settled_until = datetime.now(pytz.utc) - timedelta(days=self.settled_after_days)
+
+        frames = []
+        missing_years = []
+        live_years = []
+        for year in range(start.year, end.year + 1):
+            path = os.path.join(partition_dir, f"year={year}.parquet")
+            if os.path.exists(path):
+                frames.append(pl.scan_parquet(path))
+            elif self._is_marked_empty(partition_dir, year):
+                continue
+            elif datetime(year + 1, 1, 1, tzinfo=pytz.utc) <= settled_until:
+                missing_years.append(year)
+            else:
+                live_years.append(year)
+
+        # fetch consecutive missing years with one request and store every year as partition
+        for first_year, last_year in _consecutive_ranges(missing_years):
+            df = fetch(datetime(first_year, 1, 1, tzinfo=pytz.utc), datetime(last_year + 1, 1, 1, tzinfo=pytz.utc))
+            for year in range(first_year, last_year + 1):
+                year_df = df.filter(pl.col("date").dt.year() == year) if "date" in df.columns else pl.DataFrame()
+                # an empty year may be a DWD outage, it is requested again after a while instead of being stored
+                if year_df.is_empty():
+                    self._mark_empty(partition_dir, year)
+                    continue
+                self._write(partition_dir, year, year_df)
+                frames.append(year_df.lazy())
+
+        # years that are not settled yet are only fetched for the requested range
+        if live_years:
+            live_start = max(start, datetime(live_years[0], 1, 1, tzinfo=pytz.utc))
+            df = fetch(live_start, end)
+            if "date" in df.columns:
+                frames.append(df.lazy())
+
+        if not frames:
+            return pl.DataFrame()
+        return (pl.concat(frames, how="vertical_relaxed")
+                .filter(pl.col("date").is_between(start, end, closed="both"))
+                .sort("date")
+                .collect())
+
+    def _is_marked_empty(self, partition_dir: str, year: int) -> bool:
+        try:
+            marked_at = os.stat(os.path.join(partition_dir, f"year={year}.empty")).st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - marked_at < self.empty_year_ttl
+
+    @staticmethod
+    def _mark_empty(partition_dir: str, year: int):
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"year={year}.empty")
+        with open(path, "a"):
+            os.utime(path)
+
+    @staticmethod
+    def _write(partition_dir: str, year: int, df: pl.DataFrame):
+        os.makedirs(partition_dir, exist_ok=True)
+        # write to a temporary file first, so other workers never read a partial partition
+        file_descriptor, temp_path = tempfile.mkstemp(dir=partition_dir, suffix=".tmp")
+        os.close(file_descriptor)
+        df.write_parquet(temp_path)
+        os.replace(temp_path, os.path.join(partition_dir, f"year={year}.parquet"))
+
+
+def _consecutive_ranges(years: list[int]) -> list[tuple[int, int]]:
+    ranges = []
+    for year in years:
+        if ranges and ranges[-1][1] == year - 1:
+            ranges[-1] = (ranges[-1][0], year)
+        else:
+            ranges.append((year, year))
+    return ranges
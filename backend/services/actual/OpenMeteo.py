@@ -1,10 +1,40 @@
+import io
+import os
+import threading
+
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
 
 import openmeteo_requests
-import requests_cache
-from retry_requests import retry
+import pytz
+
+from config import CACHE_DIR, OPENMETEO_CACHE_SIZE, OPENMETEO_RECENT_DAYS, OPENMETEO_ARCHIVE_TTL, \
+    OPENMETEO_RECENT_TTL
+from services.cache import BoundedFileCache
+from services.upstream_http import upstream_http
+
+# archived measurements per model and day as Parquet, shared by all workers
+archive_cache = BoundedFileCache(os.path.join(CACHE_DIR, "openmeteo"), max_size=OPENMETEO_CACHE_SIZE)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> openmeteo_requests.Client:
+    """
+    Returns the OpenMeteo client of the current worker process, which sends
+    its requests through the pooled upstream session.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client_pid != os.getpid():
+            # the client closes its session when it is garbage collected, so it is kept for the whole worker
+            _client = openmeteo_requests.Client(session=upstream_http.session())
+            _client_pid = os.getpid()
+        return _client
+
 
 class OpenMeteo:
 
@@ -14,10 +44,27 @@ class OpenMeteo:
         bom_access_global = "bom_access_global"
 
     def get_measurements(self, model_id: str, timestamp: datetime) -> pd.DataFrame:
+        """
+        Returns the hourly archived measurements of a model for the day of
+        `timestamp`, served from `archive_cache` if possible.
+
+        Days older than OPENMETEO_RECENT_DAYS are cached for
+        OPENMETEO_ARCHIVE_TTL seconds, more recent days, which OpenMeteo may
+        still revise, for OPENMETEO_RECENT_TTL seconds.
+        """
         day = timestamp.strftime("%Y-%m-%d")
-        cache_session = requests_cache.CachedSession('.cache', expire_after = -1)
-        retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-        openmeteo = openmeteo_requests.Client(session = retry_session)
+        recent_since = datetime.now(pytz.utc).date() - timedelta(days=OPENMETEO_RECENT_DAYS)
+        ttl = OPENMETEO_RECENT_TTL if timestamp.date() >= recent_since else OPENMETEO_ARCHIVE_TTL
+
+        def load() -> bytes:
+            buffer = io.BytesIO()
+            self.__fetch_measurements(model_id, day).to_parquet(buffer)
+            return buffer.getvalue()
+
+        return pd.read_parquet(io.BytesIO(archive_cache.get_or_load(f"{model_id}:{day}", load, ttl)))
+
+    def __fetch_measurements(self, model_id: str, day: str) -> pd.DataFrame:
+        openmeteo = get_client()
 
         url = "https://archive-api.open-meteo.com/v1/archive"
         params = {
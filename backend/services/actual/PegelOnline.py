@@ -1,18 +1,17 @@
-import requests
-from .objects.GenericResponseObject import GenericResponseObject
+import numpy as np
+import pandas as pd
+from services.upstream_http import upstream_http
+from .objects.GenericResponseBatch import GenericResponseBatch
 from enum import Enum
-from datetime import datetime
-from dateutil import parser
-import pytz
 
 
-def to_generic_response(data: list[dict]) -> list[GenericResponseObject]:
+def to_generic_response(data: list[dict]) -> GenericResponseBatch:
     """
-    Convert a list of dictionary data entries into a list of GenericResponseObject instances.
+    Convert a list of dictionary data entries into a GenericResponseBatch.
 
-    This function iterates over a list of dictionaries, extracting specific information
-    from each dictionary element and creating a new GenericResponseObject instance. It
-    structures the data in a normalized format for further use.
+    This function extracts the timestamps and values of all entries at once and
+    stores them as columns, converting the timestamps to UTC. It structures the
+    data in a normalized format for further use.
 
     Arguments:
         data: list[dict]
@@ -20,24 +19,21 @@ def to_generic_response(data: list[dict]) -> list[GenericResponseObject]:
             "value", and possibly other keys.
 
     Returns:
-        list[GenericResponseObject]
-            A list of GenericResponseObject instances, each initialized with data extracted
-            from the corresponding dictionary entry.
+        GenericResponseBatch
+            A batch of the water level measurements, iterating it yields one
+            GenericResponseObject per entry.
     """
-    result: list[GenericResponseObject] = []
-    for entry in data:
-        timestamp_str = entry["timestamp"]
-        dt_local = parser.isoparse(timestamp_str)
-        dt_utc = dt_local.astimezone(pytz.UTC)
-
-        result.append(GenericResponseObject(
-            name="water_level",
-            date=dt_utc,
-            value=entry["value"],
-            unit="cm",
-            quality=2.0
-        ))
-    return result
+    dates = pd.to_datetime([entry["timestamp"] for entry in data], utc=True, format="ISO8601")
+    values = [entry["value"] for entry in data]
+    # keep the values as they are if ints and floats are mixed
+    values_dtype = object if len({type(value) for value in values}) > 1 else None
+    return GenericResponseBatch(
+        name="water_level",
+        unit="cm",
+        dates=dates.tz_localize(None).to_numpy(dtype="datetime64[ns]"),
+        values=np.array(values, dtype=values_dtype),
+        qualities=np.full(len(data), 2.0),
+    )
 
 
 class PegelOnline:
@@ -78,14 +74,14 @@ class PegelOnline:
             station_uuid (str): The UUID of the station for which measurements are to be retrieved.
 
         Returns:
-            list: A list of measurement records for the specified time period.
+            GenericResponseBatch: The measurement records for the specified time period.
 
         Raises:
             ValueError: If the provided period format is incorrect or unrecognized.
         """
         base_url = f"https://www.pegelonline.wsv.de/webservices/rest-api/v2/stations/{station.value}/W/measurements.json?"
         url = base_url + f"start={period.value}"
-        response = requests.get(url, timeout=30)
+        response = upstream_http.get(url)
         if response.status_code == 200:
             return to_generic_response(response.json())
         else:
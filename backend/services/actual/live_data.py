@@ -0,0 +1,224 @@
+import fcntl
+import logging
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Optional
+
+from config import CACHE_DIR, LIVE_DATA_DWD_TIMEOUT, LIVE_DATA_PEGEL_ONLINE_TIMEOUT, LIVE_DATA_REFRESH_INTERVAL, \
+    LIVE_DATA_RETRY_INTERVAL, LIVE_DATA_MAX_AGE
+from .DWD import DWD
+from .PegelOnline import PegelOnline
+from .objects.GenericResponseObject import GenericResponseObject
+
+# sources that time out keep their thread until the upstream request returns,
+# so the pool has room for more than one round of live data requests
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="live-data")
+
+dwd = DWD()
+pegel_online = PegelOnline()
+
+
+def get_latest_water_level() -> list[GenericResponseObject]:
+    # current default station is Konstanz Rhein
+    measurements = pegel_online.get_water_level_measurements(PegelOnline.Period.last_24_hours,
+                                                             PegelOnline.Station.KONSTANZ_RHEIN)
+    return [measurements.latest()]
+
+
+# the upstream sources of the live data in the order of the response, with their timeout in seconds
+LIVE_DATA_SOURCES: dict[str, tuple[Callable[[], list[GenericResponseObject]], float]] = {
+    "dwd_wind": (dwd.get_real_time_wind, LIVE_DATA_DWD_TIMEOUT),
+    "dwd_precipitation": (dwd.get_real_time_precipitation, LIVE_DATA_DWD_TIMEOUT),
+    "dwd_climate": (dwd.get_real_time_climate, LIVE_DATA_DWD_TIMEOUT),
+    "pegel_online": (get_latest_water_level, LIVE_DATA_PEGEL_ONLINE_TIMEOUT),
+}
+
+
+def fetch_live_data_sources() -> tuple[dict[str, list[GenericResponseObject]], list[str]]:
+    """
+    Fetches all live data sources concurrently.
+
+    Every source gets its own timeout, counted from the start of the call, so
+    the call takes as long as the slowest source that answers in time. Sources
+    that fail or time out are left out of the result.
+
+    Returns:
+        tuple[dict[str, list[GenericResponseObject]], list[str]]: The
+            measurements by source for all sources that answered and the names
+            of the sources that did not.
+    """
+    start = time.monotonic()
+    futures = {name: _executor.submit(fetch) for name, (fetch, _) in LIVE_DATA_SOURCES.items()}
+
+    results: dict[str, list[GenericResponseObject]] = {}
+    failed_sources: list[str] = []
+    for name, future in futures.items():
+        timeout = LIVE_DATA_SOURCES[name][1]
+        try:
+            results[name] = future.result(timeout=max(start + timeout - time.monotonic(), 0))
+        except TimeoutError:
+            future.cancel()
+            logging.warning(f"Live data source '{name}' did not answer within {timeout} seconds")
+            failed_sources.append(name)
+        except Exception as e:
+            logging.exception(f"Error occurred while fetching live data from '{name}':", exc_info=e)
+            failed_sources.append(name)
+    return results, failed_sources
+
+
+def get_live_data() -> tuple[list[GenericResponseObject], list[str]]:
+    """
+    Fetches all live data sources concurrently, see `fetch_live_data_sources`.
+
+    Returns:
+        tuple[list[GenericResponseObject], list[str]]: The measurements of all
+            sources that answered and the names of the sources that did not.
+    """
+    results, failed_sources = fetch_live_data_sources()
+    return [entry for measurements in results.values() for entry in measurements], failed_sources
+
+
+class LiveDataSnapshot:
+    """
+    Snapshot of the live data, refreshed in the background on the upstream
+    cadence and shared by all gunicorn workers through a file in CACHE_DIR.
+
+    Every worker runs a poller thread, but a refresh holds an exclusive file
+    lock and is skipped if another worker refreshed in the meantime, so the
+    upstream sources are polled once per `refresh_interval` regardless of the
+    number of workers and requests. Sources that fail keep their previous
+    measurements and are retried after `retry_interval` seconds. The response
+    body is serialized once per refresh, requests only compare the
+    modification time of the snapshot file.
+    """
+
+    def __init__(self, path: str, refresh_interval: float, retry_interval: float, max_age: float):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.max_age = max_age
+        self._snapshot: Optional[dict[str, Any]] = None
+        self._snapshot_mtime = None
+        self._dumps: Optional[Callable[[Any], str]] = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self, dumps: Callable[[Any], str]) -> Optional[tuple[bytes, float, list[str]]]:
+        """
+        Returns the serialized live data.
+
+        Parameters:
+            dumps (Callable): Serializes the list of measurements, used by the
+                background refreshes as well.
+
+        Returns:
+            Optional[tuple[bytes, float, list[str]]]: The JSON array of the
+                measurements, the age of the oldest measurement set in seconds
+                and the sources without any measurements, or None if no source
+                ever answered.
+        """
+        self._ensure_started(dumps)
+        snapshot = self._read()
+        if snapshot is None:
+            # only the very first request waits for the upstream sources
+            snapshot = self.refresh()
+        if not snapshot["fetched_at"]:
+            return None
+        age = max(time.time() - min(snapshot["fetched_at"].values()), 0)
+        return snapshot["body"], age, snapshot["failed_sources"]
+
+    def is_stale(self, age: float) -> bool:
+        return age > self.max_age
+
+    def refresh(self) -> dict[str, Any]:
+        """
+        Fetches all live data sources and writes a new snapshot, unless another
+        worker did so within the refresh interval.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                previous = self._read()
+                if previous is not None and time.time() - previous["refreshed_at"] < self.refresh_interval:
+                    return previous
+
+                results, failed_sources = fetch_live_data_sources()
+                data = dict(previous["data"]) if previous is not None else {}
+                fetched_at = dict(previous["fetched_at"]) if previous is not None else {}
+                for name, measurements in results.items():
+                    data[name] = GenericResponseObject.to_json_many(measurements)
+                    fetched_at[name] = time.time()
+
+                refreshed_at = time.time()
+                if failed_sources:
+                    # the next refresh is due after the retry interval instead of the refresh interval
+                    refreshed_at -= max(self.refresh_interval - self.retry_interval, 0)
+                snapshot = {
+                    "refreshed_at": refreshed_at,
+                    "data": data,
+                    "fetched_at": fetched_at,
+                    "failed_sources": [name for name in LIVE_DATA_SOURCES if name not in data],
+                    "body": self._dumps([entry for name in LIVE_DATA_SOURCES
+                                         for entry in data.get(name, [])]).encode("utf-8"),
+                }
+                self._write(snapshot)
+                return snapshot
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Optional[dict[str, Any]]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._snapshot_mtime:
+            with open(self.path, "rb") as file:
+                self._snapshot = pickle.load(file)
+            self._snapshot_mtime = mtime
+        return self._snapshot
+
+    def _write(self, snapshot: dict[str, Any]):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+    def _ensure_started(self, dumps: Callable[[Any], str]):
+        self._dumps = dumps
+        # threads do not survive a fork, so every gunicorn worker starts its own poller
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="live-data-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            snapshot = self._read()
+            if snapshot is not None:
+                # jitter, so the workers do not all wake up at the same time
+                wait = snapshot["refreshed_at"] + self.refresh_interval - time.time() \
+                    + random.uniform(0, self.refresh_interval / 100)
+                if wait > 0:
+                    time.sleep(wait)
+                    continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.exception("Error occurred while refreshing the live data snapshot:", exc_info=e)
+                time.sleep(self.retry_interval)
+
+
+live_data_snapshot = LiveDataSnapshot(os.path.join(CACHE_DIR, "live-data.pickle"),
+                                      refresh_interval=LIVE_DATA_REFRESH_INTERVAL,
+                                      retry_interval=LIVE_DATA_RETRY_INTERVAL,
+                                      max_age=LIVE_DATA_MAX_AGE)
@@ -0,0 +1,116 @@
+from typing import Iterator
+
+import numpy as np
+import orjson
+import pandas as pd
+
+from .GenericResponseObject import GenericResponseObject
+
+
+class GenericResponseBatch:
+    """
+    GenericResponseBatch is a column-wise representation of many
+    GenericResponseObject with the same name and unit.
+    Attributes:
+        name (str): The name of the measured occurrence.
+        unit (str): The unit of all measurements.
+        dates (np.ndarray): The dates of the measurements (datetime64[ns], UTC).
+        values (np.ndarray): The measurements of the occurrence.
+        qualities (np.ndarray): The quality ratings of the measurements.
+    """
+    __slots__ = ("name", "unit", "dates", "values", "qualities")
+
+    def __init__(self, name: str, unit: str, dates: np.ndarray, values: np.ndarray, qualities: np.ndarray):
+        self.name = name
+        self.unit = unit
+        self.dates = dates
+        self.values = values
+        self.qualities = qualities
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, name: str, unit: str) -> "GenericResponseBatch":
+        """
+        Creates a batch from a DataFrame with "date", "value" and "quality" columns.
+        """
+        if df.empty:
+            return cls(name, unit, np.array([], dtype="datetime64[ns]"), np.array([]), np.array([]))
+        return cls(name, unit,
+                   dates=pd.to_datetime(df["date"], utc=True).dt.tz_localize(None).to_numpy(dtype="datetime64[ns]"),
+                   values=df["value"].to_numpy(),
+                   qualities=df["quality"].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, index: int) -> GenericResponseObject:
+        return GenericResponseObject(
+            name=self.name,
+            date=pd.Timestamp(self.dates[index], tz="UTC").to_pydatetime(),
+            value=self.values[index],
+            unit=self.unit,
+            quality=self.qualities[index],
+        )
+
+    def __iter__(self) -> Iterator[GenericResponseObject]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def latest(self) -> GenericResponseObject:
+        """
+        Returns the measurement with the latest date.
+        """
+        return self[int(np.argmax(self.dates))]
+
+    def to_json(self) -> list[dict]:
+        """
+        Serializes the batch like `to_json` on every GenericResponseObject of it.
+        """
+        name, unit = self.name, self.unit
+        values = [None if value is None else str(value) for value in self.values.tolist()]
+        qualities = [None if quality is None else str(quality) for quality in self.qualities.tolist()]
+        return [{"name": name, "date": date, "value": value, "unit": unit, "quality": quality}
+                for date, value, quality in zip(_to_json_dates(self.dates), values, qualities)]
+
+    def to_response_json(self) -> bytes:
+        """
+        Serializes the batch to the same JSON as `jsonify` on a list of its
+        GenericResponseObject with the JSON provider of the app, encoding whole
+        columns at once.
+        """
+        return b"".join(self.iter_response_json())
+
+    def iter_response_json(self, chunk_size: int = 10_000, ndjson: bool = False) -> Iterator[bytes]:
+        """
+        Yields the JSON of `to_response_json` in pieces of `chunk_size`
+        records, or with `ndjson` one record per line, for streaming responses.
+        """
+        separator = "\n" if ndjson else ","
+        # the keys are sorted like the JSON provider of the app sorts them
+        prefix = '{"date":"'
+        name_infix = '","name":' + orjson.dumps(self.name).decode("utf-8") + ',"quality":'
+        unit_infix = ',"unit":' + orjson.dumps(self.unit).decode("utf-8") + ',"value":'
+        for start in range(0, len(self), chunk_size):
+            end = start + chunk_size
+            rows = separator.join(
+                prefix + date + name_infix + quality + unit_infix + value + "}" for date, value, quality in
+                zip(_to_json_dates(self.dates[start:end]), _to_json_numbers(self.values[start:end]),
+                    _to_json_numbers(self.qualities[start:end])))
+            if ndjson:
+                yield (rows + "\n").encode("utf-8")
+            else:
+                yield (("[" if start == 0 else ",") + rows).encode("utf-8")
+        # like jsonify, the body ends with a newline
+        if not ndjson:
+            yield b"]\n" if len(self) else b"[]\n"
+
+
+def _to_json_dates(dates: np.ndarray) -> list[str]:
+    # the format of custom_value_serialize, "%Y-%m-%d %H:%M:%S"
+    return [date.replace("T", " ") for date in np.datetime_as_string(dates, unit="s").tolist()]
+
+
+def _to_json_numbers(values: np.ndarray) -> list[str]:
+    # encoded by orjson like the JSON provider of the app, NaN and infinite values become null
+    if len(values) == 0:
+        return []
+    return orjson.dumps(values.tolist())[1:-1].decode("utf-8").split(",")
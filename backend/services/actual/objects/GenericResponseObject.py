@@ -5,7 +5,7 @@ from decimal import Decimal
 from ..decorators import to_json
 
 
-@dataclass(init=True)
+@dataclass(init=True, slots=True)
 @to_json.json_serializer
 class GenericResponseObject:
     """
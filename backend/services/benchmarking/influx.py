@@ -1,33 +1,231 @@
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+import influxdb_client.client.write_api
 import pandas as pd
 
-from config import influx_client, INFLUXDB_ORG
+from config import influx_client, INFLUXDB_ORG, BENCHMARK_CACHE_TTL, HTTP_CACHE_SETTLED_AFTER, CACHE_DIR
+from services.cache import TTLCache, create_cache_backend
+from services.influx import query_data_frame
 
 BUCKET = "WeatherForecast"
+BENCHMARK_BUCKET = "benchmark_score"
+# forecast errors per model and lead time of the latest scored forecast date, one series per model and lead time,
+# timestamped with the time they were materialized
+LATEST_BENCHMARK_MEASUREMENT = "latest_forecast_error"
+# forecast dates are only scored once all observations are published, which can be days after the forecast date
+LATEST_SCORED_RANGE = "-7d"
+
+BENCHMARK_COLUMNS = ["model", "cloud_cover", "dew_point_2m", "precipitation",
+                     "relative_humidity_2m", "surface_pressure", "temperature_2m",
+                     "lead_time", "forecast_date", "wind_speed_10m"]
+
+# the benchmark only changes with a scoring run, which invalidates the cache in all workers
+latest_benchmark_cache = TTLCache("latest_benchmark", ttl=BENCHMARK_CACHE_TTL)
+# daily error metrics per scoring generation, filter and day, days are only cached once they are closed
+benchmark_history_cache = create_cache_backend("benchmark_history", max_entries=4096)
+# touched after every scoring run, which may overwrite the errors of any past day
+SCORING_GENERATION_MARKER = os.path.join(CACHE_DIR, "benchmark_history.generation")
+
+
+def get_scoring_generation() -> int:
+    """
+    Returns the generation of the forecast errors, which changes with every
+    scoring run. It is part of the cache keys and the ETag of the benchmark
+    history.
+    """
+    try:
+        return os.stat(SCORING_GENERATION_MARKER).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _next_scoring_generation():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(SCORING_GENERATION_MARKER, "a"):
+        os.utime(SCORING_GENERATION_MARKER)
+
+
+def query_latest_scored_benchmark() -> pd.DataFrame:
+    """
+    Returns the forecast errors of the latest scored forecast date within
+    LATEST_SCORED_RANGE from the forecast_error measurement.
 
-def get_latest_benchmark():
-    query_api = influx_client.query_api()
+    The latest forecast date is selected in Flux from the tag index, so only
+    the rows of that forecast date are read and pivoted.
+    """
+    query = f'''
+    import "influxdata/influxdb/schema"
 
-    # Step 1: Fetch ALL rows in the last day
-    raw_query = f'''
-    from(bucket: "benchmark_score")
-    |> range(start: -1d)
+    forecastDates = schema.tagValues(
+        bucket: "{BENCHMARK_BUCKET}",
+        tag: "forecast_date",
+        predicate: (r) => r["_measurement"] == "forecast_error",
+        start: {LATEST_SCORED_RANGE},
+    )
+        |> sort(desc: true)
+        |> limit(n: 1)
+        |> findColumn(fn: (key) => true, column: "_value")
+    latestForecastDate = if length(arr: forecastDates) > 0 then forecastDates[0] else ""
+
+    from(bucket: "{BENCHMARK_BUCKET}")
+    |> range(start: {LATEST_SCORED_RANGE})
     |> filter(fn: (r) => r["_measurement"] == "forecast_error")
+    |> filter(fn: (r) => r["forecast_date"] == latestForecastDate)
+    |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    |> keep(columns: {json.dumps(BENCHMARK_COLUMNS)})
+    '''
+    return query_data_frame(query)
+
+
+def materialize_latest_benchmark() -> pd.DataFrame:
+    """
+    Writes the forecast errors of the latest scored forecast date to
+    LATEST_BENCHMARK_MEASUREMENT, drops the cached benchmark in all workers
+    and starts a new scoring generation. Runs after every scoring run.
+    """
+    df = query_latest_scored_benchmark()
+    if not df.empty:
+        # the forecast date is a field, the points are written at the current time, so reading the latest ones
+        # does not depend on how old the latest scored forecast date is
+        points = df.drop(columns=["result", "table"])
+        points.index = pd.DatetimeIndex([pd.Timestamp.now(tz="UTC")] * len(points))
+        write_api = influx_client.write_api(write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+        write_api.write(bucket=BENCHMARK_BUCKET, org=INFLUXDB_ORG, record=points,
+                        data_frame_measurement_name=LATEST_BENCHMARK_MEASUREMENT,
+                        data_frame_tag_columns=["model", "lead_time"])
+    latest_benchmark_cache.invalidate()
+    _next_scoring_generation()
+    return df
+
+
+def _query_latest_benchmark() -> pd.DataFrame:
+    query = f'''
+    from(bucket: "{BENCHMARK_BUCKET}")
+    |> range(start: 0)
+    |> filter(fn: (r) => r["_measurement"] == "{LATEST_BENCHMARK_MEASUREMENT}")
+    |> last()
     |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-    |> keep(columns: ["model", "cloud_cover", "dew_point_2m", "precipitation", 
-                        "relative_humidity_2m", "surface_pressure", "temperature_2m", 
-                        "lead_time", "forecast_date", "wind_speed_10m"])
+    |> keep(columns: {json.dumps(BENCHMARK_COLUMNS)})
     '''
+    df = query_data_frame(query)
+    if df.empty:
+        # nothing materialized yet
+        return query_latest_scored_benchmark()
+    # models that were not part of the latest scoring run keep older rows
+    return df[df["forecast_date"] == df["forecast_date"].max()].reset_index(drop=True)
+
+
+def get_latest_benchmark() -> pd.DataFrame:
+    """
+    Returns the forecast errors of the latest scored forecast date per model
+    and lead time, read from LATEST_BENCHMARK_MEASUREMENT and cached until the
+    next scoring run.
+    """
+    return latest_benchmark_cache.get("latest", _query_latest_benchmark)
+
+
+def _query_benchmark_history(start: pd.Timestamp, stop: pd.Timestamp, models: Optional[list[str]],
+                             lead_time_bucket: Optional[str]) -> pd.DataFrame:
+    model_filter = ""
+    if models:
+        model_filter = f'''|> filter(fn: (r) => contains(value: r["model"], set: {json.dumps(models)}))'''
+    lead_time_filter = ""
+    if lead_time_bucket:
+        lead_time_filter = f'''|> filter(fn: (r) => r["lead_time"] == "{lead_time_bucket}")'''
+
+    query = f'''
+    import "math"
+
+    errors = from(bucket: "{BENCHMARK_BUCKET}")
+    |> range(start: {start.strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {stop.strftime('%Y-%m-%dT%H:%M:%SZ')})
+    |> filter(fn: (r) => r["_measurement"] == "forecast_error")
+    {model_filter}
+    {lead_time_filter}
+    |> group(columns: ["model", "lead_time", "_field"])
+
+    mae = errors
+    |> map(fn: (r) => ({{r with _value: math.abs(x: r._value)}}))
+    |> aggregateWindow(every: 1d, fn: mean, createEmpty: false, timeSrc: "_start")
+    |> set(key: "metric", value: "mae")
+
+    rmse = errors
+    |> map(fn: (r) => ({{r with _value: r._value * r._value}}))
+    |> aggregateWindow(every: 1d, fn: mean, createEmpty: false, timeSrc: "_start")
+    |> map(fn: (r) => ({{r with _value: math.sqrt(x: r._value)}}))
+    |> set(key: "metric", value: "rmse")
+
+    union(tables: [mae, rmse])
+    |> pivot(rowKey:["_time", "metric"], columnKey: ["_field"], valueColumn: "_value")
+    |> drop(columns: ["_start", "_stop"])
+    '''
+    df = query_data_frame(query)
+    if df.empty:
+        return pd.DataFrame(columns=["date", "model", "lead_time", "metric"])
+    return df.drop(columns=["result", "table"]).rename(columns={"_time": "date"})
+
+
+def get_benchmark_history(start: datetime, stop: datetime, models: Optional[list[str]] = None,
+                          lead_time_bucket: Optional[str] = None) -> pd.DataFrame:
+    """
+    Returns the daily MAE and RMSE of the forecast errors per model and lead
+    time, one row per day, model, lead time and metric ("mae" or "rmse") with
+    one column per variable.
+
+    The stored errors are already the mean absolute errors per forecast date
+    written by the scorer, so "mae" is their daily mean and "rmse" the root
+    of the daily mean of their squares, not of the raw errors.
+
+    Parameters:
+        start (datetime): The first day (UTC).
+        stop (datetime): The day after the last day (UTC).
+        models (Optional[list[str]]): Only these models, all by default.
+        lead_time_bucket (Optional[str]): Only this lead time, all by default.
+
+    The metrics are aggregated in Flux. Days that ended more than
+    HTTP_CACHE_SETTLED_AFTER seconds ago are cached per day and scoring
+    generation, so only the missing days and the open ones are queried and a
+    scoring run that rewrites past days is read again.
+    """
+    start, stop = pd.Timestamp(start).floor("D"), pd.Timestamp(stop).ceil("D")
+    closed_until = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=HTTP_CACHE_SETTLED_AFTER)).floor("D")
+    filter_key = json.dumps([get_scoring_generation(), sorted(models) if models else None, lead_time_bucket])
+
+    frames = []
+    missing_days = []
+    for day in pd.date_range(start, min(stop, max(start, closed_until)), freq="D", inclusive="left"):
+        day_df = benchmark_history_cache.get(f"{filter_key}:{day.date()}")
+        if day_df is None:
+            missing_days.append(day)
+        else:
+            frames.append(day_df)
 
-    df_all = query_api.query_data_frame(raw_query)
+    # query consecutive missing days at once and cache every day, including those without errors
+    ranges = []
+    for day in missing_days:
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + pd.Timedelta(days=1)
+        else:
+            ranges.append([day, day + pd.Timedelta(days=1)])
+    for range_start, range_stop in ranges:
+        df = _query_benchmark_history(range_start, range_stop, models, lead_time_bucket)
+        for day in pd.date_range(range_start, range_stop, freq="D", inclusive="left"):
+            day_df = df[df["date"] == day].reset_index(drop=True)
+            benchmark_history_cache.set(f"{filter_key}:{day.date()}", day_df)
+            frames.append(day_df)
 
-    if isinstance(df_all, list):
-        df_all = pd.concat(df_all)
-    df_all = df_all.reset_index(drop=True)
+    if max(start, closed_until) < stop:
+        frames.append(_query_benchmark_history(max(start, closed_until), stop, models, lead_time_bucket))
 
-    # Get the latest timestamp
-    latest_forecast_datetime = df_all["forecast_date"].max()
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=["date", "model", "lead_time", "metric"])
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values(["date", "model", "lead_time", "metric"], kind="stable").reset_index(drop=True)
 
-    # Filter only rows with that latest timestamp
-    df_latest = df_all[df_all["forecast_date"] == latest_forecast_datetime]
 
-    return df_latest
+if __name__ == '__main__':
+    # run by the scorer after every scoring run
+    print(f"materialized {len(materialize_latest_benchmark())} rows")
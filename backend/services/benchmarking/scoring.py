@@ -0,0 +1,297 @@
+"""
+Scores the archived forecasts against the observations and writes the
+forecast errors to the forecast_error measurement read by
+services.benchmarking.influx.
+
+Score the last day, or backfill any range of forecast dates with several
+processes, from the backend directory with:
+    python -m services.benchmarking.scoring [--start 2025-01-01] [--stop 2025-02-01] [--model icon_seamless]
+        [--workers 4] [--chunk-days 1]
+
+Points are identified by model, lead time and forecast date, so scoring a
+range again overwrites its previous errors.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+import influxdb_client.client.write_api
+import numpy as np
+import pandas as pd
+
+from config import influx_client, INFLUXDB_ORG, SCORING_WORKERS, SCORING_DEFAULT_DAYS
+from services.actual.DWD import DWD
+from services.benchmarking.influx import BENCHMARK_BUCKET, BUCKET, materialize_latest_benchmark
+from services.influx import MAX_LEAD_HOURS, query_data_frame
+from services.raspi_station import get_station_data_frame_from_influxdb
+
+FORECAST_ERROR_MEASUREMENT = "forecast_error"
+
+SCORED_VARIABLES = ["cloud_cover", "dew_point_2m", "precipitation", "relative_humidity_2m", "surface_pressure",
+                    "temperature_2m", "wind_speed_10m"]
+
+# lead time buckets and the upper end of their lead hours, the lower end is the upper end of the previous one
+LEAD_TIME_BUCKETS = {"s": 24, "m": 72, "l": MAX_LEAD_HOURS}
+_LEAD_TIME_NAMES = np.array(list(LEAD_TIME_BUCKETS))
+_LEAD_TIME_EDGES = np.array([0] + list(LEAD_TIME_BUCKETS.values()), dtype=float)
+
+# hourly DWD parameter, dataset and factor to the OpenMeteo unit of every scored variable,
+# wetterdienst converts fractions to decimals and wind speeds to m/s
+DWD_OBSERVATIONS = {
+    "cloud_cover": (DWD.Params.cloud_cover, DWD.Dataset.cloudiness, 100),
+    "dew_point_2m": (DWD.Params.dew_point, DWD.Dataset.dew_point, 1),
+    "precipitation": (DWD.Params.precipitation, DWD.Dataset.precipitation, 1),
+    "relative_humidity_2m": (DWD.Params.humidity, DWD.Dataset.temperature_air, 100),
+    "surface_pressure": (DWD.Params.pressure, DWD.Dataset.pressure, 1),
+    "temperature_2m": (DWD.Params.temperature, DWD.Dataset.temperature_air, 1),
+    "wind_speed_10m": (DWD.Params.wind_speed, DWD.Dataset.wind, 3.6),
+}
+# weather station fields that replace the DWD observations wherever the station has a sample
+STATION_OBSERVATIONS = {
+    "relative_humidity_2m": "humidity",
+    "temperature_2m": "temperature",
+}
+# station samples further away from the full hour are not used
+STATION_MAX_OFFSET = pd.Timedelta(minutes=10)
+
+
+def query_forecasts(start: datetime, stop: datetime, models: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    Returns all forecast runs for the forecast dates in [start, stop), one row
+    per model, forecast date and run, like `get_forecasts` for many forecast
+    dates and models at once.
+    """
+    model_filter = ""
+    if models:
+        model_filter = f'''|> filter(fn: (r) => contains(value: r["model"], set: {json.dumps(models)}))'''
+
+    query = f'''
+        import "date"
+        from(bucket: "{BUCKET}")
+        |> range(start: date.sub(from:{start.strftime('%Y-%m-%dT%H:%M:%SZ')}, d:{MAX_LEAD_HOURS}h), stop: {stop.strftime('%Y-%m-%dT%H:%M:%SZ')})
+        |> filter(fn: (r) => r["_measurement"] == "forecast")
+        |> filter(fn: (r) => r["forecast_date"] >= "{start.strftime('%Y-%m-%dT%H:%M:%SZ')}" and r["forecast_date"] < "{stop.strftime('%Y-%m-%dT%H:%M:%SZ')}")
+        {model_filter}
+        |> filter(fn: (r) => contains(value: r["_field"], set: {json.dumps(SCORED_VARIABLES)}))
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> keep(columns: {json.dumps(["_time", "model", "forecast_date"] + SCORED_VARIABLES)})
+    '''
+    return query_data_frame(query)
+
+
+def _nearest(times: np.ndarray, sample_times: np.ndarray, max_offset: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Joins every time to the nearest of the sorted `sample_times` (all in
+    nanoseconds). Returns the index of the nearest sample and whether it is at
+    most `max_offset` nanoseconds away.
+    """
+    if len(sample_times) == 0:
+        return np.zeros(len(times), dtype=np.int64), np.zeros(len(times), dtype=bool)
+    right = np.searchsorted(sample_times, times).clip(max=len(sample_times) - 1)
+    left = (right - 1).clip(min=0)
+    nearest = np.where(np.abs(sample_times[left] - times) <= np.abs(sample_times[right] - times), left, right)
+    return nearest, np.abs(sample_times[nearest] - times) <= max_offset
+
+
+def _join_samples(times: np.ndarray, sample_times: pd.Series, values: pd.Series, max_offset: int) -> np.ndarray:
+    sample_times = pd.DatetimeIndex(sample_times).as_unit("ns").asi8
+    order = np.argsort(sample_times, kind="stable")
+    nearest, matched = _nearest(times, sample_times[order], max_offset)
+    joined = values.to_numpy(dtype=float)[order][nearest] if len(order) else np.full(len(times), np.nan)
+    return np.where(matched, joined, np.nan)
+
+
+def get_observations(start: datetime, stop: datetime) -> pd.DataFrame:
+    """
+    Returns the observations of all scored variables at every full hour in
+    [start, stop) in the units of the forecasts, NaN where nothing was
+    observed.
+
+    The hourly DWD observations of the Konstanz station are used, except where
+    the weather station has a sample within STATION_MAX_OFFSET of the hour.
+    """
+    hours = pd.date_range(start, stop, freq="h", inclusive="left", name="time")
+    times = hours.as_unit("ns").asi8
+
+    dwd = DWD()
+    observations = {}
+    for variable, (parameter, dataset, factor) in DWD_OBSERVATIONS.items():
+        df = dwd.get_hourly_observations(parameter, dataset, start, stop)
+        if df.empty:
+            observations[variable] = np.full(len(times), np.nan)
+        else:
+            observations[variable] = _join_samples(times, df["date"], df["value"] * factor, 0)
+
+    station = get_station_data_frame_from_influxdb(start, stop)
+    for variable, field in STATION_OBSERVATIONS.items():
+        if field in station.columns:
+            values = _join_samples(times, station["time"], station[field], STATION_MAX_OFFSET.value)
+            observations[variable] = np.where(np.isnan(values), observations[variable], values)
+
+    return pd.DataFrame(observations, index=hours)
+
+
+def score_forecasts(forecasts: pd.DataFrame, observations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the mean absolute error of every variable per model, lead time
+    bucket and forecast date, indexed by the forecast date.
+
+    All forecast runs are joined to the observations and reduced to the
+    errors of all groups in a single pass over NumPy arrays. Runs at or after
+    their forecast date are left out, as are forecast dates without an
+    observation of every scored variable (e.g. hours DWD has not published
+    yet), so they are scored by a later run once all variables are observed.
+
+    Parameters:
+        forecasts (pd.DataFrame): Forecast runs as returned by `query_forecasts`.
+        observations (pd.DataFrame): Observations as returned by `get_observations`.
+
+    Returns:
+        pd.DataFrame: The tag columns "model", "lead_time" and "forecast_date"
+            and one column per scored variable.
+    """
+    columns = ["model", "lead_time", "forecast_date"] + SCORED_VARIABLES
+    if forecasts.empty:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz="UTC", name="time"))
+
+    forecast_dates = pd.DatetimeIndex(pd.to_datetime(forecasts["forecast_date"], utc=True)).as_unit("ns").asi8
+    runs = pd.DatetimeIndex(forecasts["_time"]).as_unit("ns").asi8
+    lead_hours = (forecast_dates - runs) / 3.6e12
+    in_bucket = (lead_hours > 0) & (lead_hours <= _LEAD_TIME_EDGES[-1])
+    buckets = np.searchsorted(_LEAD_TIME_EDGES, lead_hours, side="left") - 1
+
+    observation_times = observations.index.as_unit("ns").asi8
+    nearest, matched = _nearest(forecast_dates, observation_times, 0)
+    observed = observations.reindex(columns=SCORED_VARIABLES).to_numpy(dtype=float)
+    if len(observed):
+        observed = observed[nearest]
+    else:
+        observed = np.full((len(forecasts), len(SCORED_VARIABLES)), np.nan)
+    errors = np.abs(forecasts.reindex(columns=SCORED_VARIABLES).to_numpy(dtype=float) - observed)
+    fully_observed = matched & ~np.isnan(observed).any(axis=1)
+
+    # one group id per model, lead time bucket and forecast date
+    model_codes, model_names = pd.factorize(forecasts["model"])
+    date_codes, dates = pd.factorize(forecast_dates)
+    groups = (model_codes * len(LEAD_TIME_BUCKETS) + buckets) * len(dates) + date_codes
+    scored = in_bucket & fully_observed
+    groups, errors = groups[scored], errors[scored]
+    if len(groups) == 0:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz="UTC", name="time"))
+
+    order = np.argsort(groups, kind="stable")
+    groups, errors = groups[order], errors[order]
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    observed_counts = np.add.reduceat(~np.isnan(errors), starts, axis=0)
+    error_sums = np.add.reduceat(np.nan_to_num(errors), starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_errors = np.where(observed_counts > 0, error_sums / observed_counts, np.nan)
+
+    group_ids = groups[starts]
+    group_dates = pd.DatetimeIndex(dates[group_ids % len(dates)], tz="UTC", name="time")
+    group_buckets = (group_ids // len(dates)) % len(LEAD_TIME_BUCKETS)
+    group_models = group_ids // len(dates) // len(LEAD_TIME_BUCKETS)
+
+    df = pd.DataFrame(mean_errors, columns=SCORED_VARIABLES, index=group_dates)
+    df.insert(0, "model", np.asarray(model_names)[group_models])
+    df.insert(1, "lead_time", _LEAD_TIME_NAMES[group_buckets])
+    df.insert(2, "forecast_date", group_dates.strftime("%Y-%m-%dT%H:%M:%S+00:00"))
+    return df[observed_counts.any(axis=1)]
+
+
+def write_forecast_errors(errors: pd.DataFrame):
+    """
+    Writes the errors returned by `score_forecasts` as forecast_error points
+    with a single write.
+    """
+    if errors.empty:
+        return
+    write_api = influx_client.write_api(write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+    write_api.write(bucket=BENCHMARK_BUCKET, org=INFLUXDB_ORG, record=errors,
+                    data_frame_measurement_name=FORECAST_ERROR_MEASUREMENT,
+                    data_frame_tag_columns=["model", "lead_time", "forecast_date"])
+    write_api.close()
+
+
+def score_range(start: datetime, stop: datetime, models: Optional[list[str]] = None,
+                observations: Optional[pd.DataFrame] = None) -> int:
+    """
+    Scores the forecasts for the forecast dates in [start, stop) and writes
+    their errors. Returns the number of written points.
+
+    `observations` can be passed if they were already loaded for the range.
+    """
+    if observations is None:
+        observations = get_observations(start, stop)
+    errors = score_forecasts(query_forecasts(start, stop, models), observations)
+    write_forecast_errors(errors)
+    return len(errors)
+
+
+def _score_chunk(chunk: tuple[pd.Timestamp, pd.Timestamp, Optional[list[str]], pd.DataFrame]) -> int:
+    start, stop, models, observations = chunk
+    return score_range(start, stop, models, observations)
+
+
+def backfill(start: datetime, stop: datetime, models: Optional[list[str]] = None, workers: int = SCORING_WORKERS,
+             chunk_days: int = 1) -> int:
+    """
+    Scores the forecast dates in [start, stop) in chunks of `chunk_days` days
+    on `workers` processes and updates the latest benchmark afterwards.
+    Returns the number of written points.
+
+    The observations of the whole range are loaded once, so DWD is not
+    requested by every worker.
+    """
+    start, stop = pd.Timestamp(start), pd.Timestamp(stop)
+    observations = get_observations(start, stop)
+    bounds = list(pd.date_range(start, stop, freq=f"{chunk_days}D", inclusive="left")) + [stop]
+    chunks = [(chunk_start, chunk_stop, models, observations[chunk_start:chunk_stop - pd.Timedelta(1)])
+              for chunk_start, chunk_stop in zip(bounds[:-1], bounds[1:])]
+
+    written = 0
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            written += _score_chunk(chunk)
+    else:
+        # spawned workers create their own InfluxDB client instead of sharing the connections of this process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for (chunk_start, _, _, _), count in zip(chunks, executor.map(_score_chunk, chunks)):
+                logging.info(f"Scored {count} forecast errors from {chunk_start}")
+                written += count
+
+    materialize_latest_benchmark()
+    return written
+
+
+def main():
+    def utc_date(value: str) -> pd.Timestamp:
+        return pd.Timestamp(datetime.strptime(value, "%Y-%m-%d"), tz="UTC")
+
+    parser = argparse.ArgumentParser(description="Scores the archived forecasts and writes the forecast errors.")
+    parser.add_argument("--start", type=utc_date,
+                        help=f"first forecast date (YYYY-MM-DD), {SCORING_DEFAULT_DAYS} days before --stop by default")
+    parser.add_argument("--stop", type=utc_date,
+                        help="day after the last forecast date (YYYY-MM-DD), the current hour by default")
+    parser.add_argument("--model", action="append", help="only score this model, all models by default")
+    parser.add_argument("--workers", type=int, default=SCORING_WORKERS, help="number of worker processes")
+    parser.add_argument("--chunk-days", type=int, default=1, help="days scored by a worker at a time")
+    args = parser.parse_args()
+
+    stop = args.stop if args.stop is not None else pd.Timestamp.now(tz="UTC").floor("h")
+    start = args.start if args.start is not None else stop - pd.Timedelta(days=SCORING_DEFAULT_DAYS)
+    if start >= stop:
+        parser.error("--start must be before --stop")
+
+    logging.basicConfig(level=logging.INFO)
+    written = backfill(start, stop, args.model, args.workers, args.chunk_days)
+    print(f"scored {written} forecast errors from {start} until {stop}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+import fcntl
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, CACHE_BACKEND
+
+# background reloads of expired entries share one small pool per worker
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+
+
+class TTLCache:
+    """
+    In-process cache for slowly changing query results.
+
+    Entries younger than `ttl` seconds are served directly. Older entries are
+    still served (stale-while-revalidate) while a background thread reloads
+    them, so only the very first request or a request after `max_stale`
+    seconds pays for the query. Loads of the same key are never run twice at
+    the same time.
+
+    Invalidations are broadcast to the other gunicorn workers through a marker
+    file in CACHE_DIR, which every worker checks at most once per second.
+    """
+
+    def __init__(self, name: str, ttl: float, max_stale: Optional[float] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries: dict[Hashable, tuple[float, Any]] = {}
+        self._locks: dict[Hashable, threading.Lock] = {}
+        self._refreshing: set[Hashable] = set()
+        self._lock = threading.Lock()
+        self._marker = os.path.join(CACHE_DIR, f"{name}.invalidated")
+        self._marker_checked_at = 0.0
+        self._marker_mtime = self._read_marker()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key` and calls `loader` to (re)load it if
+        required.
+        """
+        self._check_marker()
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                return entry[1]
+            if self.max_stale is None or age < self.ttl + self.max_stale:
+                self._refresh_in_background(key, loader)
+                return entry[1]
+        return self._load(key, loader)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        Drops one key or, without a key, all entries in this and all other
+        workers.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if key is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(self._marker, "a"):
+                os.utime(self._marker)
+            self._marker_mtime = self._read_marker()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # another request may have loaded the key while we were waiting
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            value = loader()
+            self._entries[key] = (time.monotonic(), value)
+            return value
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Any]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader)
+            except Exception as e:
+                logging.exception(f"Error occurred while refreshing cache '{self.name}' for key '{key}':",
+                                  exc_info=e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        _refresh_executor.submit(refresh)
+
+    def _check_marker(self):
+        now = time.monotonic()
+        if now - self._marker_checked_at < 1:
+            return
+        self._marker_checked_at = now
+        mtime = self._read_marker()
+        if mtime != self._marker_mtime:
+            self._marker_mtime = mtime
+            with self._lock:
+                self._entries.clear()
+
+    def _read_marker(self) -> int:
+        try:
+            return os.stat(self._marker).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+
+class MemoryCacheBackend:
+    """
+    Least recently used key value store in the memory of one worker.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._locks.pop(evicted, None)
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            yield
+
+
+class FileCacheBackend:
+    """
+    Key value store of pickled files in a directory, shared by all gunicorn
+    workers of a host. Writes are atomic and `lock` holds an exclusive file
+    lock, so a value is only computed by one worker at a time. Entries that
+    were not written for `max_age` seconds are removed by a write, at most
+    once per minute. Keys are locked on one of 256 lock files, which are never
+    removed, as another worker may hold them.
+    """
+
+    def __init__(self, directory: str, max_age: float = 24 * 60 * 60):
+        self.directory = directory
+        self.max_age = max_age
+        self._removed_expired_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key) + ".pickle", "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: Any):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._path(key) + ".pickle")
+        self._remove_expired()
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        # one of 256 lock files by the first byte of the key hash, so their number stays bounded
+        with open(os.path.join(self.directory, f"load-{os.path.basename(self._path(key))[:2]}.lock"), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _remove_expired(self):
+        now = time.monotonic()
+        if now - self._removed_expired_at < 60:
+            return
+        self._removed_expired_at = now
+        expired_before = time.time() - self.max_age
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".lock"):
+                continue
+            try:
+                if entry.stat().st_mtime < expired_before:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class BoundedFileCache:
+    """
+    Byte values in a directory shared by all gunicorn workers of a host,
+    bounded by their total size.
+
+    Every entry has its own expiry time, stored as the modification time of
+    its file. Hits move the access time of the file, so once the cache grows
+    beyond `max_size` bytes the least recently used entries are removed first.
+    Writes are atomic, a value is only loaded by one worker at a time and the
+    removal holds an exclusive lock on the directory. Loads are locked on one
+    of 256 lock files by the first byte of the key hash, which are never
+    removed, so a lock cannot be removed while a worker holds it.
+
+    Hits, misses and removed entries are counted per worker.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".bin")
+
+    def get_or_load(self, key: str, loader: Callable[[], bytes], ttl: float) -> bytes:
+        """
+        Returns the value of `key` and calls `loader` to load it if it is
+        missing or expired. The loaded value expires after `ttl` seconds.
+        """
+        path = self._path(key)
+        value = self._read(path)
+        if value is None:
+            with self._lock_file(self._load_lock_path(path)):
+                # another worker may have loaded the key while we were waiting
+                value = self._read(path)
+                if value is None:
+                    self.misses += 1
+                    value = loader()
+                    self.set(key, value, ttl)
+                    return value
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(value)
+        now = time.time()
+        os.utime(temp_path, (now, now + ttl))
+        os.replace(temp_path, self._path(key))
+        # entries are only written on misses, which request the upstream API anyway
+        self._remove_expired_and_least_recently_used()
+
+    def metrics(self) -> dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "entries": len(entries),
+            "size": sum(entry[2] for entry in entries),
+            "max_size": self.max_size,
+        }
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_mtime <= time.time():
+                    return None
+                value = file.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return None
+
+    def _load_lock_path(self, path: str) -> str:
+        return os.path.join(self.directory, f"load-{os.path.basename(path)[:2]}.lock")
+
+    @contextmanager
+    def _lock_file(self, path: str) -> Iterator[None]:
+        with open(path, "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _entries(self) -> list[tuple[str, float, int, float]]:
+        """
+        Returns the path, access time, size and expiry time of every entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".bin"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_atime, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remove_expired_and_least_recently_used(self):
+        with self._lock_file(os.path.join(self.directory, "cache.lock")):
+            now = time.time()
+            entries = []
+            for path, accessed_at, size, expires_at in self._entries():
+                if expires_at <= now:
+                    if self._remove(path):
+                        self.expired += 1
+                else:
+                    entries.append((accessed_at, size, path))
+            size = sum(entry[1] for entry in entries)
+            for _, entry_size, path in sorted(entries):
+                if size <= self.max_size:
+                    break
+                if self._remove(path):
+                    self.evicted += 1
+                size -= entry_size
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+
+def create_cache_backend(name: str, max_entries: int = 128):
+    """
+    Creates the cache backend configured with CACHE_BACKEND, either "memory"
+    (default, one cache per worker, at most `max_entries` entries) or "file"
+    (one cache per host in CACHE_DIR).
+    """
+    if CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(max_entries)
+    if CACHE_BACKEND == "file":
+        return FileCacheBackend(os.path.join(CACHE_DIR, name))
+    raise ValueError(f"Unknown cache backend '{CACHE_BACKEND}', must be either 'memory' or 'file'")
+
+
+class SerializedRows:
+    """
+    Rows of a DataFrame, each already encoded as JSON and ordered by a time
+    column, so a JSON array of all rows from a point in time onwards can be
+    built without decoding them again.
+    """
+
+    def __init__(self, times: np.ndarray, rows: list[bytes]):
+        self.times = times
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, time_column: str, dumps: Callable[[Any], str]) -> "SerializedRows":
+        df = df.sort_values(time_column, kind="stable")
+        times = pd.to_datetime(df[time_column], utc=True).to_numpy(dtype="datetime64[ns]")
+        rows = [dumps(row).encode("utf-8") for row in df.to_dict(orient='records')]
+        return cls(times, rows)
+
+    def json_from(self, start: datetime) -> bytes:
+        """
+        Returns the JSON array of all rows with a time greater than or equal to
+        `start`.
+        """
+        index = np.searchsorted(self.times, np.datetime64(pd.Timestamp(start).tz_convert("UTC").tz_localize(None), "ns"))
+        return b"[" + b",".join(self.rows[index:]) + b"]"
@@ -0,0 +1,150 @@
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+import brotli
+import zstandard
+from flask import Flask, Response, request
+
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_CACHE_SIZE
+
+# supported content codings, preferred in this order if the client accepts several with the same quality
+ENCODINGS = ["zstd", "br", "gzip"]
+# Arrow IPC and Parquet responses are already compressed internally
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv"}
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 6
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compresses a whole body with the content coding `encoding` ("zstd", "br"
+    or "gzip").
+    """
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    raise ValueError(f"Unknown content coding '{encoding}'")
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """
+    Compresses a streamed body chunk by chunk. Every chunk is flushed, so the
+    client can decode it as soon as it arrives.
+    """
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+    elif encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    else:
+        raise ValueError(f"Unknown content coding '{encoding}'")
+
+
+class CompressedBodyCache:
+    """
+    Least recently used store of compressed bodies by ETag and content coding,
+    bounded by the total size of the bodies. A strong ETag identifies the body,
+    so every variant only has to be compressed once per worker.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is not None:
+                self._entries.move_to_end((etag, encoding))
+            return body
+
+    def set(self, etag: str, encoding: str, body: bytes):
+        if len(body) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop((etag, encoding), None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class ResponseCompression:
+    """
+    Compresses JSON, NDJSON and CSV responses with zstd, brotli or gzip,
+    negotiated from the Accept-Encoding header.
+
+    Bodies smaller than `min_size` bytes are sent as they are. 304 responses
+    get the same Vary header and weakened ETag as the full response. Compressed
+    bodies of responses with a strong ETag are kept in a CompressedBodyCache,
+    so cached responses are not compressed again on every hit. Streamed
+    responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, min_size: int, cache_size: int):
+        self.min_size = min_size
+        self.cache = CompressedBodyCache(cache_size)
+
+    def init_app(self, app: Flask):
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response: Response) -> Response:
+        if (response.status_code not in (200, 304) or response.direct_passthrough
+                or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        # the body depends on Accept-Encoding even if this request is answered uncompressed
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        # the encoded body differs from the one a strong ETag was computed for. A 304 has no body to tell whether
+        # the full response would be compressed, so the ETag is weakened whenever a content coding is negotiated.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        if response.status_code == 304:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_chunks(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compressed = self.cache.get(etag, encoding) if etag and not weak else None
+            if compressed is None:
+                compressed = compress(body, encoding)
+                if etag and not weak:
+                    self.cache.set(etag, encoding, compressed)
+            response.set_data(compressed)
+
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+response_compression = ResponseCompression(min_size=COMPRESSION_MIN_SIZE, cache_size=COMPRESSION_CACHE_SIZE)
@@ -1,30 +1,52 @@
+import numpy as np
 import pandas as pd
 
+# weather codes (WMO) that are reported as fog or depositing rime fog
+FOG_WEATHER_CODES = [45, 48]
+
+# thresholds for the condition based fog detection
+MAX_DEW_POINT_SPREAD = 2
+MIN_RELATIVE_HUMIDITY = 90
+MAX_WIND_SPEED = 5
+
+# columns required for the condition based fog detection
+CONDITION_COLUMNS = ["temperature_2m", "dew_point_2m",
+                     "relative_humidity_2m", "wind_speed_10m"]
+# all columns fog can be derived from
+FOG_INPUT_COLUMNS = ["weather_code"] + CONDITION_COLUMNS
+
 
 def add_fog(df: pd.DataFrame) -> pd.DataFrame:
     if "weather_code" in df.columns:
         return add_fog_based_on_weather_code(df)
 
-    required_columns = ["temperature_2m", "dew_point_2m",
-                        "relative_humidity_2m", "wind_speed_10m"]
-
-    if all(col in df.columns for col in required_columns):
+    if all(col in df.columns for col in CONDITION_COLUMNS):
         return add_fog_based_on_conditions(df)
 
     return df
 
 
-def add_fog_based_on_conditions(df: pd.DataFrame) -> pd.DataFrame:
-    def is_fog(temp, dew_point, humidity, wind_speed):
-        return (temp - dew_point <= 2) and (humidity >= 90) and (wind_speed <= 5)
+def is_fog(temperature: np.ndarray, dew_point: np.ndarray, humidity: np.ndarray, wind_speed: np.ndarray) -> np.ndarray:
+    """
+    Classifies fog on whole columns at once. Missing values never satisfy a
+    threshold, so rows with NaN in any input are classified as no fog.
+    """
+    with np.errstate(invalid="ignore"):
+        return ((temperature - dew_point <= MAX_DEW_POINT_SPREAD)
+                & (humidity >= MIN_RELATIVE_HUMIDITY)
+                & (wind_speed <= MAX_WIND_SPEED))
+
 
-    df["fog"] = df.apply(
-        lambda row: is_fog(row["temperature_2m"], row["dew_point_2m"], row["relative_humidity_2m"], row["wind_speed_10m"]), axis=1
+def add_fog_based_on_conditions(df: pd.DataFrame) -> pd.DataFrame:
+    df["fog"] = is_fog(
+        df["temperature_2m"].to_numpy(dtype=float, na_value=np.nan),
+        df["dew_point_2m"].to_numpy(dtype=float, na_value=np.nan),
+        df["relative_humidity_2m"].to_numpy(dtype=float, na_value=np.nan),
+        df["wind_speed_10m"].to_numpy(dtype=float, na_value=np.nan),
     )
     return df
 
 
 def add_fog_based_on_weather_code(df: pd.DataFrame) -> pd.DataFrame:
-    df["fog"] = df.apply(lambda row: 1 if row["weather_code"] in [
-                         45, 48] else 0, axis=1)
+    df["fog"] = df["weather_code"].isin(FOG_WEATHER_CODES).astype(int)
     return df
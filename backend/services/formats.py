@@ -0,0 +1,51 @@
+import io
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from flask import Request, Response, current_app
+
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+CSV_MIMETYPE = "text/csv"
+JSON_MIMETYPE = "application/json"
+
+COLUMNAR_MIMETYPES = [ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE, CSV_MIMETYPE]
+
+
+def get_columnar_mimetype(request: Request) -> Optional[str]:
+    """
+    Returns the columnar format preferred in the Accept header (Arrow IPC
+    stream, Parquet or CSV), or None if JSON is preferred or nothing specific
+    is requested.
+    """
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE] + COLUMNAR_MIMETYPES)
+    return best if best in COLUMNAR_MIMETYPES else None
+
+
+def encode_frame(df: pd.DataFrame, mimetype: str) -> bytes:
+    """
+    Encodes a DataFrame without its index as Arrow IPC stream, Parquet or CSV.
+    Dates keep their type in Arrow and Parquet and are written like
+    "2024-01-01 00:00:00+00:00" in CSV.
+    """
+    if mimetype == CSV_MIMETYPE:
+        return df.to_csv(index=False).encode("utf-8")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if mimetype == ARROW_STREAM_MIMETYPE:
+        sink = pa.BufferOutputStream()
+        # compressed buffers are decompressed transparently by every Arrow reader
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if mimetype == PARQUET_MIMETYPE:
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False, compression="zstd")
+        return buffer.getvalue()
+    raise ValueError(f"Unsupported columnar format '{mimetype}'")
+
+
+def frame_response(df: pd.DataFrame, mimetype: str) -> Response:
+    return current_app.response_class(encode_frame(df, mimetype), mimetype=mimetype)
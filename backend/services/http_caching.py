@@ -0,0 +1,86 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+from flask import Request, Response, current_app
+
+from config import HTTP_CACHE_IMMUTABLE_MAX_AGE, HTTP_CACHE_MAX_AGE
+
+# part of every ETag, bump it when the encoding of responses changes so clients drop their copies
+_ETAG_VERSION = "1"
+
+
+def is_settled(stop: datetime, settled_after: timedelta) -> bool:
+    """
+    Returns whether data up to `stop` no longer changes, i.e. `stop` is more
+    than `settled_after` in the past.
+    """
+    return stop <= datetime.now(pytz.utc) - settled_after
+
+
+def request_etag(request: Request, *freshness) -> str:
+    """
+    Returns an ETag for the current request, derived from its path, its query
+    parameters and `freshness`: the negotiated response format and whatever
+    identifies the version of the underlying data. No data has to be queried
+    to compute it.
+    """
+    parts = [_ETAG_VERSION, request.path]
+    parts += [f"{key}={value}" for key, value in sorted(request.args.items(multi=True))]
+    parts += [str(part) for part in freshness]
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None,
+                 immutable: bool = False, mimetype: Optional[str] = None) -> Optional[Response]:
+    """
+    Returns a 304 response if the client already has the current response,
+    either by `etag` (If-None-Match) or, without If-None-Match, by
+    `last_modified` (If-Modified-Since). Returns None if the response has to be
+    built.
+
+    `mimetype` is the one of the full response (JSON by default), so the 304
+    gets the same ETag and Vary headers from the response compression.
+    """
+    if request.if_none_match:
+        matches = request.if_none_match.contains_weak(etag)
+    else:
+        matches = (last_modified is not None and request.if_modified_since is not None
+                   and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if not matches:
+        return None
+    response = current_app.response_class(status=304, mimetype=mimetype or "application/json")
+    return with_cache_headers(request, response, etag, last_modified, immutable)
+
+
+def with_cache_headers(request: Request, response: Response, etag: Optional[str] = None,
+                       last_modified: Optional[datetime] = None, immutable: bool = False) -> Response:
+    """
+    Adds ETag, Last-Modified and Cache-Control headers to a successful
+    response. Immutable responses are cached for HTTP_CACHE_IMMUTABLE_MAX_AGE
+    seconds, all others for HTTP_CACHE_MAX_AGE seconds.
+
+    Without `etag`, the ETag is computed from the body and a matching
+    conditional request is still answered with 304, which saves the transfer
+    but not the query. Streamed responses without `etag` only get
+    Cache-Control.
+    """
+    if response.status_code not in (200, 304):
+        return response
+
+    if immutable:
+        response.headers["Cache-Control"] = f"public, max-age={HTTP_CACHE_IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response.headers["Cache-Control"] = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    # the format is negotiated with the Accept header
+    response.vary.add("Accept")
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    if etag is not None:
+        response.set_etag(etag)
+    elif not response.is_streamed:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
@@ -1,15 +1,157 @@
-from typing import Optional
+import csv
+import io
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
 from datetime import datetime
 import pandas as pd
 import pytz
+from influxdb_client.client.flux_csv_parser import FluxQueryException
 
-from services.fog import add_fog
-from config import influx_client, INFLUXDB_ORG
+from services.cache import TTLCache, SerializedRows, create_cache_backend
+from services.fog import add_fog, FOG_INPUT_COLUMNS
+from config import influx_client, INFLUXDB_ORG, MODELS_CACHE_TTL, INGEST_TIME_CACHE_TTL, WATER_LEVEL_ROLLUP_INTERVAL
 
 BUCKET = "WeatherForecast"
 
 influx_api = influx_client.query_api()
 
+# tag values only change when a new model starts writing forecasts
+tag_values_cache = TTLCache("tag_values", ttl=MODELS_CACHE_TTL)
+# serialized current forecasts per model and forecast run
+current_forecast_cache = create_cache_backend("current_forecast")
+ingest_time_cache = TTLCache("ingest_time", ttl=INGEST_TIME_CACHE_TTL)
+# the rollup watermark only moves forward, an outdated one just reads more raw water levels
+water_level_watermark_cache = TTLCache("water_level_watermark", ttl=WATER_LEVEL_ROLLUP_INTERVAL)
+
+
+def query_data_frame(query: str) -> pd.DataFrame:
+    """
+    Runs a Flux query and decodes the annotated CSV response directly into a
+    typed DataFrame.
+
+    The response is read line by line and every table block is parsed with the
+    pandas CSV parser, so no intermediate FluxRecord or dict is created per row.
+    Columns are returned the same way the record based parsing named them,
+    including `result` and `table`.
+    """
+    frames = query_tables(query)
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def query_tables(query: str) -> list[pd.DataFrame]:
+    """
+    Runs a Flux query and returns one DataFrame per result table, each with
+    only the columns of its table.
+    """
+    response = influx_api.query_raw(query=query, org=INFLUXDB_ORG)
+    try:
+        return list(_decode_annotated_csv(response))
+    finally:
+        response.close()
+
+
+def stream_data_frames(query: str, chunk_rows: int = 10_000) -> Iterator[pd.DataFrame]:
+    """
+    Runs a Flux query and yields the decoded result in DataFrames of at most
+    `chunk_rows` rows while the response is still being received, so large
+    results never have to be held in memory at once.
+    """
+    response = influx_api.query_raw(query=query, org=INFLUXDB_ORG)
+    try:
+        yield from _decode_annotated_csv(response, chunk_rows)
+    finally:
+        response.close()
+
+
+def _decode_annotated_csv(lines: Iterable[bytes], chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Splits an annotated CSV stream into its table blocks (a new block starts
+    with a new set of annotations) and yields one DataFrame per block, or per
+    `chunk_rows` rows of a block.
+    """
+    annotations = {}
+    header = None
+    block = None
+    rows = 0
+    for line in lines:
+        if line.startswith(b"#"):
+            if block is not None:
+                yield _decode_csv_block(annotations, block)
+                annotations, block = {}, None
+            header = None
+            row = next(csv.reader([line.decode("utf-8").rstrip("\r\n")]))
+            annotations[row[0][1:]] = row[1:]
+        elif not line.strip():
+            if block is not None:
+                yield _decode_csv_block(annotations, block)
+                annotations, block = {}, None
+            header = None
+        else:
+            if block is None:
+                block = io.BytesIO()
+                rows = 0
+                # a chunk continues the table of the previous chunk with the same header
+                if header is not None:
+                    block.write(header)
+                    rows = 1
+                else:
+                    header = line
+            else:
+                rows += 1
+            block.write(line)
+            if chunk_rows is not None and rows >= chunk_rows:
+                yield _decode_csv_block(annotations, block)
+                block = None
+    if block is not None:
+        yield _decode_csv_block(annotations, block)
+
+
+def _decode_csv_block(annotations: dict, block: io.BytesIO) -> pd.DataFrame:
+    block.seek(0)
+    # the first column only carries the annotation names and is empty for data rows
+    columns = next(csv.reader([block.readline().decode("utf-8").rstrip("\r\n")]))[1:]
+
+    if columns[:2] == ["error", "reference"]:
+        row = next(csv.reader([block.readline().decode("utf-8").rstrip("\r\n")]))[1:]
+        raise FluxQueryException(row[0], row[1] if len(row) > 1 else "")
+
+    data_types = annotations.get("datatype", ["string"] * len(columns))
+    defaults = annotations.get("default", [""] * len(columns))
+
+    dtype, na_values, date_columns, bool_columns = {}, {}, [], []
+    for column, data_type in zip(columns, data_types):
+        na_values[column] = [""]
+        if data_type == "string":
+            dtype[column] = object
+        elif data_type == "double":
+            dtype[column] = "float64"
+            na_values[column] = ["", "NaN"]
+        elif data_type.startswith("dateTime"):
+            dtype[column] = object
+            date_columns.append(column)
+        elif data_type == "boolean":
+            dtype[column] = object
+            bool_columns.append(column)
+
+    df = pd.read_csv(block, header=None, names=[""] + columns, usecols=range(1, len(columns) + 1),
+                     dtype=dtype, keep_default_na=False, na_values=na_values)
+
+    for column, default in zip(columns, defaults):
+        if default != "":
+            df[column] = df[column].fillna(default)
+    for column in date_columns:
+        df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+    for column in bool_columns:
+        df[column] = df[column].map({"true": True, "false": False})
+    for column, data_type in zip(columns, data_types):
+        if data_type == "string" and df[column].hasnans:
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
 
 def _query_tag_values(tag_key: str):
     query = f'''
@@ -28,40 +170,64 @@ def _query_tag_values(tag_key: str):
     return tag_keys
 
 
+def get_tag_values(tag_key: str):
+    return tag_values_cache.get(tag_key, lambda: _query_tag_values(tag_key))
+
+
 def get_models():
-    models = _query_tag_values("model")
+    models = get_tag_values("model")
     return models
 
 
-def get_forecasts(model_id: str, forecast_datetime: datetime):
+# forecasts are written for up to 14 days ahead
+MAX_LEAD_HOURS = 14 * 24
+
+
+def get_forecasts(model_id: str, forecast_datetime: datetime, fields: Optional[list[str]] = None,
+                  max_lead: Optional[int] = None):
+    """
+    Returns all forecasts of a model for `forecast_datetime`, one row per
+    forecast run.
+
+    `fields` restricts the queried fields, "fog" requests the fog detection and
+    queries the fields it is derived from. `max_lead` restricts the forecast
+    runs to those at most `max_lead` hours before `forecast_datetime`. Both are
+    applied in Flux, so InfluxDB reads fewer series and shards.
+    """
+    lead_hours = MAX_LEAD_HOURS if max_lead is None else min(max_lead, MAX_LEAD_HOURS)
+
+    field_filter = ""
+    if fields is not None:
+        query_fields = [field for field in fields if field != "fog"]
+        if "fog" in fields:
+            query_fields += [field for field in FOG_INPUT_COLUMNS if field not in query_fields]
+        field_filter = f'''|> filter(fn: (r) => contains(value: r["_field"], set: {json.dumps(query_fields)}))'''
+
     query = f'''
         import "date"
         from(bucket: "{BUCKET}")
-        |> range(start: date.sub(from:{forecast_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')}, d:14d), stop: {forecast_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')})
+        |> range(start: date.sub(from:{forecast_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')}, d:{lead_hours}h), stop: {forecast_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')})
         |> filter(fn: (r) => r["_measurement"] == "forecast")
         |> filter(fn: (r) => r["forecast_date"] == "{forecast_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')}")
         |> filter(fn: (r) => r["model"] == "{model_id}")
+        {field_filter}
         |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
         |> sort(columns: ["_time"])
     '''
 
-    query_api = influx_client.query_api()
-    tables = query_api.query(query=query, org=INFLUXDB_ORG)
-
-    # Parse query results into a DataFrame
-    data = []
-    for table in tables:
-        for record in table.records:
-            data.append(record.values)
-
-    df = pd.DataFrame(data)
+    df = query_data_frame(query)
     df["forecast_date"] = pd.to_datetime(df["forecast_date"])
-    df = add_fog(df)
+    if fields is None or "fog" in fields:
+        df = add_fog(df)
+
+    if fields is not None:
+        # drop the fog inputs that were only queried to derive fog
+        df = df.drop(columns=[field for field in FOG_INPUT_COLUMNS if field in df.columns and field not in fields])
 
     return df
 
 
-def get_current_forecast(model_id: str):
+def get_current_forecast(model_id: str, include_past: bool = False):
     query = f'''
         import "date"
         from(bucket: "{BUCKET}")
@@ -74,29 +240,119 @@ def get_current_forecast(model_id: str):
         |> drop(columns: ["_start", "_stop", "_time", "_measurement"])
     '''
 
-    query_api = influx_client.query_api()
-    tables = query_api.query(query=query, org=INFLUXDB_ORG)
-
-    # Parse query results into a DataFrame
-    data = []
-    for table in tables:
-        for record in table.records:
-            data.append(record.values)
-
-    if len(data) == 0:
+    df = query_data_frame(query)
+    if df.empty:
         raise ValueError("No data for requested forecast date")
 
-    df = pd.DataFrame(data)
     df["forecast_date"] = pd.to_datetime(df["forecast_date"])
     df = add_fog(df)
 
+    if include_past:
+        return df
+
     # Filter rows where forecast_date is greater than or equal to now
     utc_now = datetime.now(pytz.utc)
     df = df[df["forecast_date"] >= utc_now]
     return df
 
 
-def _query_water_level(station_id: int, start: datetime, stop: datetime, aggregate_window: Optional[str] = None):
+def get_current_forecasts(model_ids: Optional[list[str]] = None) -> dict[str, pd.DataFrame]:
+    """
+    Returns the current forecasts of several models, or of all models if
+    `model_ids` is None, queried and pivoted in a single Flux query.
+
+    The pivot returns one table per model with only the fields of that model,
+    so every forecast has the same columns as `get_current_forecast` returns.
+    """
+    model_filter = ""
+    if model_ids is not None:
+        model_filter = f'''|> filter(fn: (r) => contains(value: r["model"], set: {json.dumps(model_ids)}))'''
+
+    query = f'''
+        from(bucket: "{BUCKET}")
+        |> range(start: -2h)
+        |> filter(fn: (r) => r["_measurement"] == "forecast")
+        {model_filter}
+        |> last()
+        |> pivot(rowKey:["forecast_date"], columnKey: ["_field"], valueColumn: "_value")
+        |> drop(columns: ["_start", "_stop", "_time", "_measurement"])
+    '''
+
+    tables: dict[str, list[pd.DataFrame]] = {}
+    for table in query_tables(query):
+        if not table.empty:
+            tables.setdefault(table["model"].iloc[0], []).append(table)
+    if not tables:
+        raise ValueError("No data for requested forecast date")
+
+    utc_now = datetime.now(pytz.utc)
+    forecasts = {model: pd.DataFrame() for model in model_ids or []}
+    for model, model_tables in tables.items():
+        model_df = model_tables[0] if len(model_tables) == 1 else pd.concat(model_tables, ignore_index=True)
+        model_df["forecast_date"] = pd.to_datetime(model_df["forecast_date"])
+        model_df = add_fog(model_df.sort_values("forecast_date", kind="stable"))
+        # Filter rows where forecast_date is greater than or equal to now
+        forecasts[model] = model_df[model_df["forecast_date"] >= utc_now]
+    return forecasts
+
+
+def get_latest_ingest_time(model_id: str) -> Optional[pd.Timestamp]:
+    """
+    Returns the time of the latest forecast run of a model written within the
+    last two hours, or None if there is none.
+    """
+    query = f'''
+        from(bucket: "{BUCKET}")
+        |> range(start: -2h)
+        |> filter(fn: (r) => r["_measurement"] == "forecast")
+        |> filter(fn: (r) => r["model"] == "{model_id}")
+        |> last()
+        |> keep(columns: ["_time"])
+        |> group()
+        |> max(column: "_time")
+    '''
+
+    df = query_data_frame(query)
+    if df.empty:
+        return None
+    return df["_time"].iloc[0]
+
+
+def get_cached_ingest_time(model_id: str) -> Optional[pd.Timestamp]:
+    """
+    Returns the time of the latest forecast run of a model like
+    `get_latest_ingest_time`, queried at most every INGEST_TIME_CACHE_TTL
+    seconds.
+    """
+    return ingest_time_cache.get(model_id, lambda: get_latest_ingest_time(model_id))
+
+
+def get_current_forecast_json(model_id: str, dumps: Callable[[Any], str]) -> bytes:
+    """
+    Returns the current forecast of a model as a JSON array encoded with `dumps`.
+
+    The serialized forecast is cached per model and forecast run, so the
+    forecast query only runs once per model and run. Rows in the past are
+    dropped from the cached rows on every call.
+    """
+    ingest_time = get_cached_ingest_time(model_id)
+    if ingest_time is None:
+        raise ValueError("No data for requested forecast date")
+
+    key = f"{model_id}:{ingest_time.isoformat()}"
+    rows = current_forecast_cache.get(key)
+    if rows is None:
+        with current_forecast_cache.lock(key):
+            rows = current_forecast_cache.get(key)
+            if rows is None:
+                df = get_current_forecast(model_id, include_past=True)
+                rows = SerializedRows.from_frame(df, "forecast_date", dumps)
+                current_forecast_cache.set(key, rows)
+
+    return rows.json_from(datetime.now(pytz.utc))
+
+
+def _water_level_query(station_id: int, start: datetime, stop: datetime, aggregate_window: Optional[str] = None):
     base_query = f'''
     from(bucket: "{BUCKET}")
       |> range(start: {start.strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {stop.strftime('%Y-%m-%dT%H:%M:%SZ')})
@@ -111,22 +367,227 @@ def _query_water_level(station_id: int, start: datetime, stop: datetime, aggrega
     base_query += '''
     |> drop(columns: ["_measurement", "_field", "table", "_start", "_stop", "station_id"])
   '''
+    return base_query
 
-    query_api = influx_client.query_api()
-    tables = query_api.query(query=base_query, org=INFLUXDB_ORG)
 
-    # Parse query results into a DataFrame
-    data = []
-    for table in tables:
-        for record in table.records:
-            data.append(record.values)
-
-    df = pd.DataFrame(data)
+def _to_water_level_frame(df: pd.DataFrame, period: Optional[str] = None):
     df = df.drop(columns=["result", "table"])
     df = df.rename(columns={"_time": "date", "_value": "value"})
+    return _to_period_dates(df, period)
+
+
+def _to_period_dates(df: pd.DataFrame, period: Optional[str] = None):
+    if period:
+        df["date"] = pd.to_datetime(df["date"]).dt.to_period(period).dt.to_timestamp()
     return df
 
 
+def _query_water_level(station_id: int, start: datetime, stop: datetime, aggregate_window: Optional[str] = None):
+    if aggregate_window is not None:
+        watermark = get_water_level_rollup_watermark(station_id)
+        if watermark is not None:
+            return _query_water_level_rollups(station_id, start, stop, aggregate_window, watermark)
+    return _to_water_level_frame(query_data_frame(_water_level_query(station_id, start, stop, aggregate_window)))
+
+
+# downsampled water levels (mean, min, max and count per window), maintained by services.water_level_rollups
+WATER_LEVEL_ROLLUP_MEASUREMENT = "water_level_rollup"
+# end of the last day rolled up per station, the rollups of all windows that ended until then are complete
+WATER_LEVEL_ROLLUP_STATE_MEASUREMENT = "water_level_rollup_state"
+# rollups an aggregate window is assembled from, coarsest first, every one consists of whole windows of the next
+WATER_LEVEL_ROLLUP_LEVELS = {
+    "1d": ["1d"],
+    "1w": ["1w", "1d"],
+    "1mo": ["1mo", "1d"],
+    "1y": ["1y", "1mo", "1d"],
+}
+
+
+def water_level_window_start(times: pd.DatetimeIndex, every: str) -> pd.DatetimeIndex:
+    """
+    Returns the start of the window of `every` (one of WATER_LEVEL_ROLLUP_LEVELS)
+    that contains each of the UTC `times`. Windows are aligned like those of
+    aggregateWindow, in particular weeks are aligned to the Unix epoch and
+    start on Thursday.
+    """
+    if every == "1d":
+        return times.floor("D")
+    if every == "1w":
+        return times.floor("7D")
+    period = {"1mo": "M", "1y": "Y"}[every]
+    return times.tz_convert(None).to_period(period).to_timestamp().tz_localize("UTC")
+
+
+def water_level_window_end(starts: pd.DatetimeIndex, every: str) -> pd.DatetimeIndex:
+    if every == "1d":
+        return starts + pd.Timedelta(days=1)
+    if every == "1w":
+        return starts + pd.Timedelta(days=7)
+    return starts + pd.DateOffset(months=1 if every == "1mo" else 12)
+
+
+def aggregate_water_level_windows(df: pd.DataFrame, every: str) -> pd.DataFrame:
+    """
+    Combines water level aggregates (columns `_time`, `mean`, `min`, `max` and
+    `count`) of windows that lie within the windows of `every` into the
+    aggregates of these windows, indexed by the window start. Raw points are
+    aggregates of a single value.
+    """
+    windows = water_level_window_start(pd.DatetimeIndex(df["_time"]), every)
+    df = df.assign(window=windows, weighted=df["mean"] * df["count"])
+    df = df.groupby("window", sort=True).agg(weighted=("weighted", "sum"), min=("min", "min"),
+                                             max=("max", "max"), count=("count", "sum"))
+    df["mean"] = df.pop("weighted") / df["count"]
+    return df[["mean", "min", "max", "count"]]
+
+
+def get_water_level_rollup_watermark(station_id: int) -> Optional[pd.Timestamp]:
+    """
+    Returns the time until which the water levels of a station are rolled up,
+    or None if they were never rolled up.
+    """
+    def query_watermark():
+        df = query_data_frame(f'''
+            from(bucket: "{BUCKET}")
+            |> range(start: 0, stop: 1970-01-01T00:00:01Z)
+            |> filter(fn: (r) => r["_measurement"] == "{WATER_LEVEL_ROLLUP_STATE_MEASUREMENT}")
+            |> filter(fn: (r) => r["_field"] == "rolled_up_until")
+            |> filter(fn: (r) => r["station_id"] == "{station_id}")
+            |> last()
+        ''')
+        if df.empty:
+            return None
+        return pd.Timestamp(int(df["_value"].iloc[0]), unit="s", tz="UTC")
+
+    return water_level_watermark_cache.get(station_id, query_watermark)
+
+
+def _split_water_level_range(start: pd.Timestamp, stop: pd.Timestamp,
+                             levels: list[str]) -> list[tuple[Optional[str], pd.Timestamp, pd.Timestamp]]:
+    """
+    Splits [start, stop) into ranges of whole windows of the coarsest possible
+    rollup level. Remainders that are shorter than a day are returned with the
+    level None and are read from the raw water levels.
+    """
+    if start >= stop:
+        return []
+    if not levels:
+        return [(None, start, stop)]
+    every, finer_levels = levels[0], levels[1:]
+    first = water_level_window_start(pd.DatetimeIndex([start]), every)[0]
+    if first < start:
+        first = water_level_window_end(pd.DatetimeIndex([first]), every)[0]
+    last = water_level_window_start(pd.DatetimeIndex([stop]), every)[0]
+    if first >= last:
+        return _split_water_level_range(start, stop, finer_levels)
+    return (_split_water_level_range(start, first, finer_levels) + [(every, first, last)]
+            + _split_water_level_range(last, stop, finer_levels))
+
+
+def _flux_time(time: pd.Timestamp) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def query_water_level_rollups(station_id: int, ranges: list[tuple[str, pd.Timestamp, pd.Timestamp]]) -> pd.DataFrame:
+    """
+    Returns the rollups of a station for a list of (level, start, stop) ranges
+    with the columns `_time` (window start), `mean`, `min`, `max` and `count`.
+    """
+    tables = ",\n".join(f'''
+            from(bucket: "{BUCKET}")
+            |> range(start: {_flux_time(start)}, stop: {_flux_time(stop)})
+            |> filter(fn: (r) => r["_measurement"] == "{WATER_LEVEL_ROLLUP_MEASUREMENT}")
+            |> filter(fn: (r) => r["station_id"] == "{station_id}")
+            |> filter(fn: (r) => r["period"] == "{every}")''' for every, start, stop in ranges)
+    df = query_data_frame(f'''
+        union(tables: [{tables}])
+        |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> keep(columns: ["_time", "mean", "min", "max", "count"])
+    ''')
+    if df.empty:
+        return pd.DataFrame(columns=["_time", "mean", "min", "max", "count"])
+    return df[["_time", "mean", "min", "max", "count"]]
+
+
+def query_raw_water_levels(station_id: int, ranges: list[tuple[pd.Timestamp, pd.Timestamp]]) -> pd.DataFrame:
+    """
+    Returns the raw water levels of a station for a list of (start, stop)
+    ranges as aggregates of a single value (columns like
+    `query_water_level_rollups`).
+    """
+    tables = ",\n".join(f'''
+            from(bucket: "{BUCKET}")
+            |> range(start: {_flux_time(start)}, stop: {_flux_time(stop)})
+            |> filter(fn: (r) => r["_measurement"] == "water_level")
+            |> filter(fn: (r) => r["_field"] == "value")
+            |> filter(fn: (r) => r["station_id"] == "{station_id}")''' for start, stop in ranges)
+    df = query_data_frame(f'''
+        union(tables: [{tables}])
+        |> keep(columns: ["_time", "_value"])
+    ''')
+    if df.empty:
+        return pd.DataFrame(columns=["_time", "mean", "min", "max", "count"])
+    return pd.DataFrame({"_time": df["_time"], "mean": df["_value"], "min": df["_value"], "max": df["_value"],
+                         "count": 1})
+
+
+def _query_water_level_rollups(station_id: int, start: datetime, stop: datetime, aggregate_window: str,
+                               watermark: pd.Timestamp) -> pd.DataFrame:
+    """
+    Returns the same frame as the aggregateWindow query of
+    `_water_level_query`, assembled from the coarsest rollups that cover the
+    range, the raw water levels of partial days and of everything after the
+    watermark.
+    """
+    start, stop = pd.Timestamp(start), pd.Timestamp(stop)
+    pieces = _split_water_level_range(start, min(stop, watermark), WATER_LEVEL_ROLLUP_LEVELS[aggregate_window])
+    if max(start, watermark) < stop:
+        pieces.append((None, max(start, watermark), stop))
+
+    frames = []
+    rollup_ranges = [piece for piece in pieces if piece[0] is not None]
+    if rollup_ranges:
+        frames.append(query_water_level_rollups(station_id, rollup_ranges))
+    raw_ranges = [(piece_start, piece_stop) for every, piece_start, piece_stop in pieces if every is None]
+    if raw_ranges:
+        frames.append(query_raw_water_levels(station_id, raw_ranges))
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=["date", "value"])
+
+    df = aggregate_water_level_windows(pd.concat(frames, ignore_index=True), aggregate_window)
+    # like aggregateWindow, every window is timestamped with its end, cut off at the end of the range
+    dates = water_level_window_end(df.index, aggregate_window)
+    return pd.DataFrame({"date": dates.where(dates < stop, stop), "value": df["mean"].to_numpy()})
+
+
+# aggregate window and pandas period of the averaged water levels
+WATER_LEVEL_PERIODS = {
+    "d": ("1d", "D"),
+    "w": ("1w", "W"),
+    "m": ("1mo", "M"),
+    "y": ("1y", "Y"),
+}
+
+
+def stream_water_level(station_id: int, start: datetime, stop: datetime,
+                       period: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Yields the archived water levels, averaged per period if `period` is one
+    of WATER_LEVEL_PERIODS, in chunks while they are read from InfluxDB.
+    """
+    aggregate_window, pandas_period = WATER_LEVEL_PERIODS[period] if period else (None, None)
+    if aggregate_window is not None:
+        watermark = get_water_level_rollup_watermark(station_id)
+        if watermark is not None:
+            # one row per window, small enough for a single chunk
+            yield _to_period_dates(_query_water_level_rollups(station_id, start, stop, aggregate_window, watermark),
+                                   pandas_period)
+            return
+    for df in stream_data_frames(_water_level_query(station_id, start, stop, aggregate_window)):
+        yield _to_water_level_frame(df, pandas_period)
+
+
 def get_archive_water_level(station_id: int, start: datetime, stop: datetime):
     df = _query_water_level(station_id, start, stop)
     return df
@@ -0,0 +1,68 @@
+import dataclasses
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import orjson
+import pandas as pd
+from flask import Response
+from flask.json.provider import JSONProvider
+
+from services.actual.decorators.to_json import custom_value_serialize
+
+_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def _default(value: Any) -> Any:
+    # datetimes (including pandas Timestamps) are written like custom_value_serialize writes them
+    if isinstance(value, datetime):
+        return None if value is pd.NaT else custom_value_serialize(value, datetime)
+    if isinstance(value, date):
+        return custom_value_serialize(value, date)
+    if isinstance(value, Decimal):
+        return custom_value_serialize(value, Decimal)
+    if value is pd.NA:
+        return None
+    # dataclasses are written field by field like the default provider does, so their keys are sorted too
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider of the app backed by orjson.
+
+    NumPy scalars and arrays are encoded natively, NaN and infinite floats
+    become null, datetimes and pandas Timestamps are formatted like
+    `custom_value_serialize` ("%Y-%m-%d %H:%M:%S") and objects with a `to_json`
+    method are serialized through it. Dataclasses are written as a dict of
+    their fields. Output is compact UTF-8 with sorted keys.
+    """
+
+    sort_keys = True
+
+    def _options(self, indent=None) -> int:
+        options = _OPTIONS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # orjson always writes compact JSON, so `separators` is accepted and ignored
+        return orjson.dumps(obj, default=_default, option=self._options(kwargs.get("indent"))).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if self._app.debug else None
+        # like the default provider, the body ends with a newline
+        body = orjson.dumps(obj, default=_default, option=self._options(indent)) + b"\n"
+        return self._app.response_class(body, mimetype="application/json")
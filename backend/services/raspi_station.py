@@ -1,27 +1,36 @@
 from datetime import datetime
+from typing import Iterator
 import influxdb_client
 import influxdb_client.client
 import influxdb_client.client.write_api
 from influxdb_client import Point
+import numpy as np
 import pandas as pd
 from config import influx_client, INFLUXDB_ORG
+from services.influx import query_data_frame, stream_data_frames
 
 BUCKET = "WeatherData"
 
+REQUIRED_FIELDS = ["timestamp", "temperature", "water_temperature", "humidity"]
+# numeric fields and the error message if they are not numeric
+NUMERIC_FIELDS = {
+    "temperature": "Temperature must be an integer or float",
+    "water_temperature": "Water temperature must be an integer or float",
+    "humidity": "Humidity must be an integer or float",
+}
 
-def save_station_data_to_influxdb(data):
+
+def create_station_point(data) -> Point:
     """
-    Save station data to InfluxDB.
+    Validate station data and convert it to an InfluxDB point.
     """
     # Check data format
     if not isinstance(data, dict):
         raise ValueError("Data must be a dictionary")
 
-    required_fields = ["timestamp", "temperature",
-                       "water_temperature", "humidity"]
-    if not all(field in data for field in required_fields):
+    if not all(field in data for field in REQUIRED_FIELDS):
         raise ValueError(
-            f"Data must contain the following fields: {', '.join(required_fields)}")
+            f"Data must contain the following fields: {', '.join(REQUIRED_FIELDS)}")
 
     # Check types
     if isinstance(data["timestamp"], str):
@@ -35,37 +44,94 @@ def save_station_data_to_influxdb(data):
         raise ValueError(
             "Timestamp must be a string in the format YYYY-MM-DDTHH:MM:SSZ")
 
-    if not isinstance(data["temperature"], (int, float)):
-        raise ValueError("Temperature must be an integer or float")
-    if not isinstance(data["water_temperature"], (int, float)):
-        raise ValueError("Water temperature must be an integer or float")
-    if not isinstance(data["humidity"], (int, float)):
-        raise ValueError("Humidity must be an integer or float")
-
-    write_api = influx_client.write_api(
-        write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+    for field, message in NUMERIC_FIELDS.items():
+        if not isinstance(data[field], (int, float)):
+            raise ValueError(message)
 
     # Create a point
-    point = Point("weather_station") \
+    return Point("weather_station") \
         .field("temperature", float(data["temperature"])) \
         .field("water_temperature", float(data["water_temperature"])) \
         .field("humidity", float(data["humidity"])) \
         .time(data["timestamp"].isoformat())
 
+
+def save_station_data_to_influxdb(data):
+    """
+    Save station data to InfluxDB.
+    """
+    point = create_station_point(data)
+
+    write_api = influx_client.write_api(
+        write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+
     # Write the point to InfluxDB
     write_api.write(bucket=BUCKET, org=INFLUXDB_ORG, record=point)
     write_api.close()
 
 
-def get_station_data_from_influxdb(start: datetime, stop: datetime):
+def create_station_frame(samples: list) -> tuple[pd.DataFrame, list[dict]]:
     """
-    Retrieve station data from InfluxDB within a specified time range.
+    Validate many station samples at once with the rules of
+    `create_station_point`.
+
+    Returns a DataFrame of the valid samples indexed by their timestamp and a
+    list with the index and the error message of every invalid sample.
     """
+    is_dict = np.fromiter((isinstance(sample, dict) for sample in samples), dtype=bool, count=len(samples))
+    records = [sample if valid else {} for sample, valid in zip(samples, is_dict)]
+    df = pd.DataFrame(records, columns=REQUIRED_FIELDS, dtype=object)
+    types = df.map(type)
+
+    errors = pd.Series(None, index=df.index, dtype=object)
+
+    def flag(mask, message):
+        errors[np.asarray(mask) & errors.isna().to_numpy()] = message
+
+    flag(~is_dict, "Data must be a dictionary")
+    # absent fields are NaN in the frame like NaN values, so they are told apart by the keys of the samples
+    missing = np.fromiter((not all(field in record for field in REQUIRED_FIELDS) for record in records),
+                          dtype=bool, count=len(records))
+    flag(missing, f"Data must contain the following fields: {', '.join(REQUIRED_FIELDS)}")
 
+    is_string = types["timestamp"] == str
+    flag(~is_string, "Timestamp must be a string in the format YYYY-MM-DDTHH:MM:SSZ")
+    timestamps = pd.to_datetime(df["timestamp"].where(is_string), format="%Y-%m-%dT%H:%M:%SZ", errors="coerce",
+                                utc=True)
+    flag(timestamps.isna(), "Timestamp must be in the format YYYY-MM-DDTHH:MM:SSZ")
+
+    for field, message in NUMERIC_FIELDS.items():
+        flag(~types[field].isin([int, float, bool]), message)
+
+    valid = errors.isna()
+    frame = df.loc[valid, list(NUMERIC_FIELDS)].astype(float)
+    frame.index = pd.DatetimeIndex(timestamps[valid], name="time")
+    invalid = errors[~valid]
+    return frame, [{"index": int(index), "error": message} for index, message in invalid.items()]
+
+
+def save_bulk_station_data_to_influxdb(samples: list) -> tuple[int, list[dict]]:
+    """
+    Save many station samples to InfluxDB with a single write.
+
+    Returns the number of written samples and the errors of the samples that
+    failed validation.
+    """
+    frame, errors = create_station_frame(samples)
+    if not frame.empty:
+        write_api = influx_client.write_api(
+            write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+        write_api.write(bucket=BUCKET, org=INFLUXDB_ORG, record=frame,
+                        data_frame_measurement_name="weather_station")
+        write_api.close()
+    return len(frame), errors
+
+
+def _station_data_query(start: datetime, stop: datetime) -> str:
     if start >= stop:
         raise ValueError("Start time must be before stop time")
 
-    query = f'''
+    return f'''
     from(bucket: "{BUCKET}")
       |> range(start: {start.strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {stop.strftime('%Y-%m-%dT%H:%M:%SZ')})
       |> filter(fn: (r) => r["_measurement"] == "weather_station")
@@ -75,16 +141,27 @@ def get_station_data_from_influxdb(start: datetime, stop: datetime):
       |> rename(columns: {{_time: "time"}})
     '''
 
-    query_api = influx_client.query_api()
-    result = query_api.query(query=query, org=INFLUXDB_ORG)
 
-    data = []
-    for table in result:
-        for record in table.records:
-            data.append(
-                record.values
-            )
+def get_station_data_frame_from_influxdb(start: datetime, stop: datetime) -> pd.DataFrame:
+    """
+    Retrieve station data from InfluxDB within a specified time range as DataFrame.
+    """
+    df = query_data_frame(_station_data_query(start, stop))
+    # an empty result has no columns at all
+    return df.drop(columns=["result", "table"], errors="ignore")
+
+
+def get_station_data_from_influxdb(start: datetime, stop: datetime):
+    """
+    Retrieve station data from InfluxDB within a specified time range.
+    """
+    return get_station_data_frame_from_influxdb(start, stop).to_dict(orient='records')
+
 
-    df = pd.DataFrame(data)
-    df = df.drop(columns=["result", "table"])
-    return df.to_dict(orient='records')
+def stream_station_data_from_influxdb(start: datetime, stop: datetime) -> Iterator[pd.DataFrame]:
+    """
+    Retrieve station data from InfluxDB within a specified time range in
+    chunks, while it is read from InfluxDB.
+    """
+    for df in stream_data_frames(_station_data_query(start, stop)):
+        yield df.drop(columns=["result", "table"])
@@ -0,0 +1,218 @@
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import influxdb_client.client.write_api
+from influxdb_client import Point
+
+from config import influx_client, INFLUXDB_ORG, STATION_INGEST_QUEUE_SIZE, STATION_INGEST_BATCH_SIZE, \
+    STATION_INGEST_FLUSH_INTERVAL, STATION_INGEST_MAX_RETRIES, STATION_INGEST_SPOOL_DIR
+from services.raspi_station import BUCKET
+
+
+class StationDataIngest:
+    """
+    Asynchronous writer for weather station points.
+
+    Points are put on a bounded queue and written by a background thread in
+    batches of up to `batch_size` points, or whatever arrived within
+    `flush_interval` seconds. Failed writes are retried with exponential
+    backoff. Batches that still cannot be written are appended as line
+    protocol to a spool file per worker, which is replayed after the next
+    successful write.
+    """
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float, max_retries: int,
+                 spool_dir: str):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.spool_dir = spool_dir
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._write_api = None
+
+        self._flush_latencies = deque(maxlen=100)
+        self._written_points = 0
+        self._spooled_points = 0
+        self._failed_flushes = 0
+        self._last_flush = None
+
+    def submit(self, point: Point):
+        """
+        Queues a point for writing.
+
+        Raises:
+            queue.Full: If the queue is full, i.e. InfluxDB does not keep up.
+        """
+        self._ensure_started()
+        self._queue.put_nowait(point)
+
+    def metrics(self) -> dict:
+        flush_latency_ms = None
+        if self._flush_latencies:
+            latencies = sorted(self._flush_latencies)
+            flush_latency_ms = {
+                "last": round(self._flush_latencies[-1] * 1000, 2),
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+                "p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2),
+            }
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "written_points": self._written_points,
+            "spooled_points": self._spooled_points,
+            "failed_flushes": self._failed_flushes,
+            "last_flush": self._last_flush,
+            "flush_latency_ms": flush_latency_ms,
+        }
+
+    def close(self, timeout: float = 10):
+        """
+        Flushes the queued points and stops the writer thread. Points that are
+        still queued after `timeout` seconds, e.g. while InfluxDB is down, are
+        spooled.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        else:
+            self._thread.join(max(deadline - time.monotonic(), 0))
+        if self._thread.is_alive():
+            lines = []
+            while True:
+                try:
+                    point = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if point is not None:
+                    lines.append(point.to_line_protocol())
+            if lines:
+                self._spool(lines)
+
+    def _ensure_started(self):
+        # threads do not survive a fork, so every gunicorn worker starts its own writer
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._write_api = influx_client.write_api(
+                    write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+                self._thread = threading.Thread(target=self._run, name="station-ingest", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            point = self._queue.get()
+            if point is None:
+                break
+            batch = [point.to_line_protocol()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    point = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if point is None:
+                    stopped = True
+                    break
+                batch.append(point.to_line_protocol())
+            self._flush(batch)
+
+    def _flush(self, lines: list[str]):
+        if self._write(lines):
+            self._replay_spool()
+        else:
+            self._spool(lines)
+
+    def _write(self, lines: list[str]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write_api.write(bucket=BUCKET, org=INFLUXDB_ORG, record=lines)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._failed_flushes += 1
+                    logging.exception(
+                        f"Error occurred while writing {len(lines)} station points to InfluxDB:", exc_info=e)
+                    return False
+                time.sleep(min(2 ** attempt, 60))
+                continue
+            self._flush_latencies.append(time.perf_counter() - start)
+            self._written_points += len(lines)
+            self._last_flush = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            return True
+        return False
+
+    def _spool_path(self, pid) -> str:
+        return os.path.join(self.spool_dir, f"station-data-{pid}.lp")
+
+    def _spool(self, lines: list[str]):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # close spools the remaining points while the writer thread may still spool a batch
+        with self._lock, open(self._spool_path(os.getpid()), "a") as file:
+            file.write("\n".join(lines) + "\n")
+            self._spooled_points += len(lines)
+        logging.warning(f"Spooled {len(lines)} station points to {self.spool_dir}")
+
+    def _replay_spool(self):
+        # replay the own spool files and those of workers that are no longer running, including files whose
+        # replay was interrupted
+        paths = glob.glob(self._spool_path("*")) + glob.glob(os.path.join(self.spool_dir, "station-data-*.replaying"))
+        for path in paths:
+            pid = int(os.path.basename(path)[len("station-data-"):].split(".")[0].split("-")[0])
+            if pid != os.getpid() and _is_running(pid):
+                continue
+            # claim the file under a new name, so no other worker replays it at the same time
+            replaying_path = os.path.join(self.spool_dir, f"station-data-{os.getpid()}-{time.time_ns()}.replaying")
+            try:
+                os.replace(path, replaying_path)
+            except FileNotFoundError:
+                continue
+            with open(replaying_path) as file:
+                lines = [line.rstrip("\n") for line in file if line.strip()]
+            self._spooled_points = max(self._spooled_points - len(lines), 0)
+            replayed = True
+            for start in range(0, len(lines), self.batch_size):
+                if not self._write(lines[start:start + self.batch_size]):
+                    # put the points that were not written back into the spool
+                    self._spool(lines[start:])
+                    replayed = False
+                    break
+            # removed only once every point is written or spooled again, writing a point twice after a crash
+            # just overwrites it
+            os.remove(replaying_path)
+            if not replayed:
+                return
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+station_ingest = StationDataIngest(max_queue_size=STATION_INGEST_QUEUE_SIZE,
+                                   batch_size=STATION_INGEST_BATCH_SIZE,
+                                   flush_interval=STATION_INGEST_FLUSH_INTERVAL,
+                                   max_retries=STATION_INGEST_MAX_RETRIES,
+                                   spool_dir=STATION_INGEST_SPOOL_DIR)
+atexit.register(station_ingest.close)
@@ -0,0 +1,69 @@
+import logging
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+from flask import Request, Response, current_app
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+JSON_MIMETYPE = "application/json"
+
+
+def get_stream_mimetype(request: Request) -> Optional[str]:
+    """
+    Returns the mimetype of the requested streaming response, NDJSON if it is
+    preferred in the Accept header, a JSON array if `stream=1` is set, or None
+    for a regular response.
+    """
+    if request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return NDJSON_MIMETYPE
+    if request.args.get("stream") in ("1", "true"):
+        return JSON_MIMETYPE
+    return None
+
+
+def encode_frames(frames: Iterator[pd.DataFrame], dumps: Callable[..., str], mimetype: str) -> Iterator[bytes]:
+    """
+    Encodes the records of DataFrame chunks as one JSON array or as NDJSON, one
+    piece per chunk. Records are serialized with `dumps` (the JSON provider of
+    the app) in the same compact form as `jsonify`.
+    """
+    ndjson = mimetype == NDJSON_MIMETYPE
+    first = True
+    for df in frames:
+        if df.empty:
+            continue
+        records = df.to_dict(orient='records')
+        if ndjson:
+            yield "".join(dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+        else:
+            # the array of the chunk without its brackets continues the streamed array
+            rows = dumps(records, separators=(",", ":"))[1:-1]
+            yield (("[" if first else ",") + rows).encode("utf-8")
+        first = False
+    if not ndjson:
+        yield b"[]\n" if first else b"]\n"
+
+
+def stream_response(chunks: Iterator[bytes], mimetype: str) -> Response:
+    """
+    Creates a response that sends the chunks as they are produced (chunked
+    transfer encoding).
+
+    The first chunk is produced before the response is returned, so errors of
+    the underlying query are still raised in the route and answered with an
+    error status. Later errors are logged and raised again, so the server
+    aborts the connection before the terminating chunk and the client sees an
+    incomplete response instead of a truncated body that looks complete.
+    """
+    chunks = iter(chunks)
+    first_chunk = next(chunks, b"")
+
+    def generate():
+        yield first_chunk
+        try:
+            yield from chunks
+        except Exception as e:
+            logging.exception("Error occurred while streaming the response:", exc_info=e)
+            raise
+
+    return current_app.response_class(generate(), mimetype=mimetype)
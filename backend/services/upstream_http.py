@@ -0,0 +1,182 @@
+import bisect
+import os
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import UPSTREAM_HTTP_POOL_CONNECTIONS, UPSTREAM_HTTP_POOL_MAXSIZE, UPSTREAM_HTTP_MAX_RETRIES, \
+    UPSTREAM_HTTP_BACKOFF_FACTOR, UPSTREAM_HTTP_CONNECT_TIMEOUT, UPSTREAM_HTTP_READ_TIMEOUT
+
+# connect and read timeouts (seconds) of the known upstream hosts
+HOST_TIMEOUTS = {
+    "www.pegelonline.wsv.de": (UPSTREAM_HTTP_CONNECT_TIMEOUT, 30),
+    "archive-api.open-meteo.com": (UPSTREAM_HTTP_CONNECT_TIMEOUT, 60),
+    "opendata.dwd.de": (UPSTREAM_HTTP_CONNECT_TIMEOUT, 60),
+}
+# upper bounds (milliseconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# upstream APIs answer these with a transient error, requests that got them are retried
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class _HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses: dict[str, int] = {}
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latency_sum = 0.0
+
+    def to_dict(self) -> dict:
+        labels = [str(bound) for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "latency_ms": {
+                "buckets": dict(zip(labels, self.latency_buckets)),
+                "mean": round(self.latency_sum / self.requests, 2) if self.requests else None,
+            },
+        }
+
+
+class _UpstreamAdapter(HTTPAdapter):
+    """
+    HTTP adapter that applies the timeouts of the host to requests without an
+    explicit timeout and records the latency of every request, including its
+    retries and the download of the body.
+    """
+
+    def __init__(self, client: "UpstreamHttp", **kwargs):
+        self.client = client
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        host = urlsplit(request.url).hostname or ""
+        if timeout is None:
+            timeout = self.client.timeout(host)
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, timeout=timeout, **kwargs)
+            if not stream:
+                # read the body here, so it is part of the measured latency
+                response.content
+        except Exception:
+            self.client.record(host, time.perf_counter() - start)
+            raise
+        retries = getattr(response.raw, "retries", None)
+        self.client.record(host, time.perf_counter() - start, response.status_code,
+                           len(retries.history) if retries is not None else 0)
+        return response
+
+
+class UpstreamHttp:
+    """
+    Pooled HTTP sessions for the upstream APIs (DWD, PegelOnline, OpenMeteo).
+
+    Every worker process has its own session, so connections are kept alive
+    between requests but never shared across a fork. Idempotent requests are
+    retried with exponential backoff on connection errors and transient
+    statuses. Requests without a timeout get the timeouts of their host from
+    HOST_TIMEOUTS, or the default ones.
+
+    The request counts and latency histograms per host and the connection pool
+    usage of the worker are returned by `metrics`.
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, max_retries: int, backoff_factor: float,
+                 default_timeout: tuple[float, float], host_timeouts: dict[str, tuple[float, float]]):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.default_timeout = default_timeout
+        self.host_timeouts = host_timeouts
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._adapters: list[_UpstreamAdapter] = []
+        self._hosts: dict[str, _HostMetrics] = {}
+
+    def timeout(self, host: str) -> tuple[float, float]:
+        return self.host_timeouts.get(host, self.default_timeout)
+
+    def session(self) -> requests.Session:
+        """
+        Returns the pooled session of the current worker process.
+        """
+        with self._lock:
+            self._check_fork()
+            if self._session is None:
+                self._session = self._configure(requests.Session())
+            return self._session
+
+    def _configure(self, session: requests.Session) -> requests.Session:
+        retry = Retry(total=self.max_retries, backoff_factor=self.backoff_factor, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=["GET", "HEAD"], raise_on_status=False, respect_retry_after_header=True)
+        adapter = _UpstreamAdapter(self, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                                   max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._adapters.append(adapter)
+        return session
+
+    def _check_fork(self):
+        # connections and counters of the parent process are not used after a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._session = None
+            self._adapters = []
+            self._hosts = {}
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.session().get(url, **kwargs)
+
+    def record(self, host: str, latency: float, status: Optional[int] = None, retries: int = 0):
+        with self._lock:
+            self._check_fork()
+            metrics = self._hosts.setdefault(host, _HostMetrics())
+            metrics.requests += 1
+            metrics.retries += retries
+            if status is None:
+                metrics.errors += 1
+            else:
+                status_class = f"{status // 100}xx"
+                metrics.statuses[status_class] = metrics.statuses.get(status_class, 0) + 1
+            latency_ms = latency * 1000
+            metrics.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            metrics.latency_sum += latency_ms
+
+    def metrics(self) -> dict:
+        with self._lock:
+            self._check_fork()
+            adapters = list(self._adapters)
+            hosts = {host: metrics.to_dict() for host, metrics in self._hosts.items()}
+        pools = {}
+        for adapter in adapters:
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                stats = pools.setdefault(pool.host, {"opened_connections": 0, "requests": 0,
+                                                     "idle_connections": 0, "max_size": 0})
+                stats["opened_connections"] += pool.num_connections
+                stats["requests"] += pool.num_requests
+                stats["idle_connections"] += sum(connection is not None for connection in list(pool.pool.queue))
+                stats["max_size"] += pool.pool.maxsize
+        return {"pid": os.getpid(), "hosts": hosts, "pools": pools}
+
+
+upstream_http = UpstreamHttp(pool_connections=UPSTREAM_HTTP_POOL_CONNECTIONS,
+                             pool_maxsize=UPSTREAM_HTTP_POOL_MAXSIZE,
+                             max_retries=UPSTREAM_HTTP_MAX_RETRIES,
+                             backoff_factor=UPSTREAM_HTTP_BACKOFF_FACTOR,
+                             default_timeout=(UPSTREAM_HTTP_CONNECT_TIMEOUT, UPSTREAM_HTTP_READ_TIMEOUT),
+                             host_timeouts=HOST_TIMEOUTS)
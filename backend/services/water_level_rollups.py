@@ -0,0 +1,229 @@
+"""
+Maintains the water level rollups read by services.influx._query_water_level.
+
+Backfill the rollups of the historical water levels (e.g. after running
+migrations/migrate_water_levels.py) from the backend directory with:
+    python -m services.water_level_rollups backfill [--station-id 906] [--start 2000-01-01]
+
+Afterwards the app keeps them up to date in the background, or run
+    python -m services.water_level_rollups update
+"""
+
+import argparse
+import fcntl
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import influxdb_client.client.write_api
+import pandas as pd
+import pytz
+from influxdb_client import Point
+
+from config import influx_client, INFLUXDB_ORG, CACHE_DIR, WATER_LEVEL_ROLLUP_INTERVAL, \
+    WATER_LEVEL_ROLLUP_SETTLED_AFTER
+from services.actual.PegelOnline import PegelOnline
+from services.influx import BUCKET, WATER_LEVEL_ROLLUP_MEASUREMENT, WATER_LEVEL_ROLLUP_STATE_MEASUREMENT, \
+    aggregate_water_level_windows, get_water_level_rollup_watermark, query_data_frame, query_raw_water_levels, \
+    query_water_level_rollups, water_level_window_end, water_level_window_start, water_level_watermark_cache
+
+# stations whose water levels are archived in InfluxDB
+WATER_LEVEL_STATIONS = [PegelOnline.Station.KONSTANZ_BODENSEE_N.value, PegelOnline.Station.KONSTANZ_RHEIN_N.value]
+
+# rollups computed from the daily rollups
+COARSE_LEVELS = ["1w", "1mo", "1y"]
+
+
+class WaterLevelRollups:
+    """
+    Daily, weekly, monthly and yearly mean, min, max and count of the water
+    levels of every station, stored as WATER_LEVEL_ROLLUP_MEASUREMENT points
+    at the start of each window.
+
+    Daily rollups are computed from the raw water levels, the coarser ones from
+    the daily rollups. Only days that ended more than `settled_after` seconds
+    ago are rolled up. The end of the last rolled up day is stored per station
+    as watermark, the rollups of all windows that ended until then are
+    complete. Rolling up works year by year and moves the watermark after every
+    year, so an interrupted backfill continues with the next update.
+
+    Every gunicorn worker runs an updater thread, but an update holds an
+    exclusive file lock and is skipped if another worker is already updating.
+    """
+
+    def __init__(self, stations: list[int], update_interval: float, settled_after: float, lock_path: str):
+        self.stations = stations
+        self.update_interval = update_interval
+        self.settled_after = settled_after
+        self.lock_path = lock_path
+        self._write_api = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def settled_until(self) -> pd.Timestamp:
+        return (pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=self.settled_after)).floor("D")
+
+    def backfill(self, station_id: int, start: Optional[datetime] = None) -> Optional[pd.Timestamp]:
+        """
+        Rolls up the water levels of a station from the start of the year of
+        `start`, or of the first archived water level, until the last settled
+        day.
+
+        Returns:
+            Optional[pd.Timestamp]: The new watermark, or None if the station has
+                no water levels.
+        """
+        start = pd.Timestamp(start) if start is not None else self._first_water_level(station_id)
+        if start is None:
+            return None
+        if start.tzinfo is None:
+            start = start.tz_localize("UTC")
+        # whole years, so the monthly and yearly windows at the start are complete
+        return self._roll_up(station_id, water_level_window_start(pd.DatetimeIndex([start]), "1y")[0])
+
+    def update(self, station_id: int) -> Optional[pd.Timestamp]:
+        """
+        Rolls up the water levels of a station from its watermark until the
+        last settled day. Stations that were never backfilled are skipped.
+        """
+        watermark = self._query_watermark(station_id)
+        if watermark is None:
+            logging.info(f"Water levels of station {station_id} were never rolled up, run the backfill first")
+            return None
+        return self._roll_up(station_id, watermark)
+
+    def update_all(self):
+        for station_id in self.stations:
+            self.update(station_id)
+
+    def ensure_started(self):
+        # threads do not survive a fork, so every gunicorn worker starts its own updater
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="water-level-rollups", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            # jitter, so the workers do not all try at the same time
+            time.sleep(self.update_interval + random.uniform(0, self.update_interval / 100))
+            os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                try:
+                    self.update_all()
+                except Exception as e:
+                    logging.exception("Error occurred while updating the water level rollups:", exc_info=e)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _roll_up(self, station_id: int, start: pd.Timestamp) -> pd.Timestamp:
+        stop = self.settled_until()
+        if start >= stop:
+            return start
+        while start < stop:
+            year = water_level_window_start(pd.DatetimeIndex([start]), "1y")
+            year_stop = min(water_level_window_end(year, "1y")[0], stop)
+            self._roll_up_days(station_id, start, year_stop)
+            self._write_watermark(station_id, year_stop)
+            start = year_stop
+        # let all workers read the new watermark
+        water_level_watermark_cache.invalidate()
+        return start
+
+    def _roll_up_days(self, station_id: int, start: pd.Timestamp, stop: pd.Timestamp):
+        """
+        Writes the daily rollups of [start, stop) and the coarser rollups of
+        all windows that end within (start, stop], both day aligned.
+        """
+        raw = query_raw_water_levels(station_id, [(start, stop)])
+        if not raw.empty:
+            self._write(station_id, "1d", aggregate_water_level_windows(raw, "1d"))
+
+        for every in COARSE_LEVELS:
+            first_window = water_level_window_start(pd.DatetimeIndex([start]), every)[0]
+            days = query_water_level_rollups(station_id, [("1d", first_window, stop)])
+            if days.empty:
+                continue
+            windows = aggregate_water_level_windows(days, every)
+            # only windows that are complete and were not complete before
+            ends = water_level_window_end(windows.index, every)
+            windows = windows[(ends > start) & (ends <= stop)]
+            if not windows.empty:
+                self._write(station_id, every, windows)
+
+    def _write(self, station_id: int, every: str, df: pd.DataFrame):
+        df = df.assign(station_id=str(station_id), period=every)
+        self._get_write_api().write(bucket=BUCKET, org=INFLUXDB_ORG, record=df,
+                                    data_frame_measurement_name=WATER_LEVEL_ROLLUP_MEASUREMENT,
+                                    data_frame_tag_columns=["station_id", "period"])
+
+    def _write_watermark(self, station_id: int, watermark: pd.Timestamp):
+        # a single point per station at the Unix epoch, every update overwrites it
+        point = Point(WATER_LEVEL_ROLLUP_STATE_MEASUREMENT) \
+            .tag("station_id", str(station_id)) \
+            .field("rolled_up_until", int(watermark.timestamp())) \
+            .time(datetime(1970, 1, 1, tzinfo=pytz.utc))
+        self._get_write_api().write(bucket=BUCKET, org=INFLUXDB_ORG, record=point)
+
+    def _query_watermark(self, station_id: int) -> Optional[pd.Timestamp]:
+        water_level_watermark_cache.invalidate(station_id)
+        return get_water_level_rollup_watermark(station_id)
+
+    def _first_water_level(self, station_id: int) -> Optional[pd.Timestamp]:
+        df = query_data_frame(f'''
+            from(bucket: "{BUCKET}")
+            |> range(start: 0)
+            |> filter(fn: (r) => r["_measurement"] == "water_level")
+            |> filter(fn: (r) => r["_field"] == "value")
+            |> filter(fn: (r) => r["station_id"] == "{station_id}")
+            |> first()
+            |> keep(columns: ["_time"])
+        ''')
+        if df.empty:
+            return None
+        return df["_time"].min()
+
+    def _get_write_api(self):
+        if self._write_api is None:
+            self._write_api = influx_client.write_api(write_options=influxdb_client.client.write_api.SYNCHRONOUS)
+        return self._write_api
+
+
+water_level_rollups = WaterLevelRollups(WATER_LEVEL_STATIONS,
+                                        update_interval=WATER_LEVEL_ROLLUP_INTERVAL,
+                                        settled_after=WATER_LEVEL_ROLLUP_SETTLED_AFTER,
+                                        lock_path=os.path.join(CACHE_DIR, "water-level-rollups.lock"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintains the water level rollups in InfluxDB.")
+    parser.add_argument("command", choices=["backfill", "update"])
+    parser.add_argument("--station-id", type=int, action="append",
+                        help="PegelOnline station number, all archived stations by default")
+    parser.add_argument("--start", type=lambda value: datetime.strptime(value, "%Y-%m-%d"),
+                        help="backfill from the start of this year (YYYY-MM-DD) instead of the first water level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for station_id in args.station_id or WATER_LEVEL_STATIONS:
+        if args.command == "backfill":
+            watermark = water_level_rollups.backfill(station_id, args.start)
+        else:
+            watermark = water_level_rollups.update(station_id)
+        print(f"station {station_id}: rolled up until {watermark}")
+
+
+if __name__ == '__main__':
+    main()
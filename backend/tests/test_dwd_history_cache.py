@@ -0,0 +1,132 @@
+"""
+Offline tests of the DWD history cache against a fixture frame in the layout
+of a wetterdienst hourly observation response (Konstanz, station 2712).
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import os
+from datetime import datetime
+
+import polars as pl
+import pytest
+import pytz
+
+from services.actual.DwdHistoryCache import DwdHistoryCache
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "dwd_hourly_temperature_air_2712.csv")
+PARTITION = ("temperature_air", "hourly", "temperature_air_mean_2m")
+
+
+@pytest.fixture
+def recorded() -> pl.DataFrame:
+    return pl.read_csv(FIXTURE, schema_overrides={"station_id": pl.String}).with_columns(
+        pl.col("date").str.to_datetime(time_zone="UTC"))
+
+
+class FakeFetch:
+    """
+    Serves the recorded frame like a DWD request (start and end day inclusive)
+    and records the requested ranges.
+    """
+
+    def __init__(self, df: pl.DataFrame):
+        self.df = df
+        self.calls = []
+
+    def __call__(self, start: datetime, end: datetime) -> pl.DataFrame:
+        self.calls.append((start, end))
+        return self.df.filter(pl.col("date").dt.date().is_between(start.date(), end.date(), closed="both"))
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=pytz.utc)
+
+
+def settled_after_days(settled_until: datetime) -> int:
+    # years that ended by `settled_until` are settled, later ones are not
+    return (datetime.now(pytz.utc) - settled_until).days
+
+
+def partition_path(directory, year: int) -> str:
+    dataset, frequency, parameter = PARTITION
+    return os.path.join(directory, f"dataset={dataset}", f"frequency={frequency}", f"parameter={parameter}",
+                        f"year={year}.parquet")
+
+
+def test_settled_years_are_written_as_partitions(tmp_path, recorded):
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2022, 1, 1)))
+    fetch = FakeFetch(recorded)
+
+    df = cache.get(*PARTITION, utc(2019, 12, 31), utc(2021, 7, 1), fetch)
+
+    assert fetch.calls == [(utc(2019, 1, 1), utc(2022, 1, 1))]
+    for year in (2019, 2020, 2021):
+        partition = pl.read_parquet(partition_path(tmp_path, year))
+        assert partition["date"].dt.year().unique().to_list() == [year]
+    assert df["date"].is_sorted()
+
+    # the second request is served from the partitions only
+    assert cache.get(*PARTITION, utc(2019, 12, 31), utc(2021, 7, 1), fetch).equals(df)
+    assert len(fetch.calls) == 1
+
+
+def test_range_boundaries_are_filtered(tmp_path, recorded):
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2022, 1, 1)))
+
+    # start and end are truncated to their day, the end day is included up to its first observation
+    df = cache.get(*PARTITION, utc(2020, 1, 1, 12), utc(2020, 7, 1, 18), FakeFetch(recorded))
+
+    assert df["date"].min() == utc(2020, 1, 1)
+    assert df["date"].max() == utc(2020, 7, 1)
+    assert df.height == recorded.filter(pl.col("date").is_between(utc(2020, 1, 1), utc(2020, 7, 1))).height
+
+
+def test_live_years_are_fetched_again(tmp_path, recorded):
+    # 2020 is settled, 2021 is not
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2021, 6, 1)))
+    fetch = FakeFetch(recorded)
+
+    first = cache.get(*PARTITION, utc(2020, 6, 30), utc(2021, 7, 1), fetch)
+    second = cache.get(*PARTITION, utc(2020, 6, 30), utc(2021, 7, 1), fetch)
+
+    assert fetch.calls == [(utc(2020, 1, 1), utc(2021, 1, 1)), (utc(2021, 1, 1), utc(2021, 7, 1)),
+                           (utc(2021, 1, 1), utc(2021, 7, 1))]
+    assert os.path.exists(partition_path(tmp_path, 2020))
+    assert not os.path.exists(partition_path(tmp_path, 2021))
+    assert first.equals(second)
+    assert first["date"].dt.year().unique().sort().to_list() == [2020, 2021]
+
+
+def test_empty_settled_years_are_marked_for_a_while(tmp_path, recorded):
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2022, 1, 1)))
+    empty_fetch = FakeFetch(recorded.clear())
+
+    assert cache.get(*PARTITION, utc(2020, 1, 1), utc(2020, 12, 31), empty_fetch).is_empty()
+    assert not os.path.exists(partition_path(tmp_path, 2020))
+
+    # the empty year is not requested again until its marker expires
+    assert cache.get(*PARTITION, utc(2020, 1, 1), utc(2020, 12, 31), empty_fetch).is_empty()
+    assert len(empty_fetch.calls) == 1
+
+
+def test_empty_settled_years_are_requested_again(tmp_path, recorded):
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2022, 1, 1)), empty_year_ttl=0)
+
+    assert cache.get(*PARTITION, utc(2020, 1, 1), utc(2020, 12, 31), FakeFetch(recorded.clear())).is_empty()
+
+    # the year is requested again once the marker expired and stored once DWD answers
+    fetch = FakeFetch(recorded)
+    assert not cache.get(*PARTITION, utc(2020, 1, 1), utc(2020, 12, 31), fetch).is_empty()
+    assert len(fetch.calls) == 1
+    assert os.path.exists(partition_path(tmp_path, 2020))
+
+
+def test_responses_without_date_column(tmp_path):
+    cache = DwdHistoryCache(str(tmp_path), settled_after_days(utc(2021, 6, 1)))
+
+    df = cache.get(*PARTITION, utc(2020, 1, 1), utc(2021, 7, 1), lambda start, end: pl.DataFrame())
+
+    assert df.is_empty()
+    assert not os.path.exists(partition_path(tmp_path, 2020))